@@ -2,32 +2,55 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
 from loguru import logger
 
-from core.redis import redis
-from core.schema import BaseResponse, ResponseCode
+from setting import setting
+from core.db import warmup_engines, dispose_engines
+from core.cache import cache, start_invalidation_listener
+from core.warmup import start_warmup
+from core.request_log import request_log
+from core.batch_writer import start_batch_writers, stop_batch_writers
+from core.schema import BaseResponse, ResponseCode, ModelResponse
 from core.exception import ApiException
-from core.middleware import SlowRequestMiddleware, log_request
+from core.profiler import setup_slow_query_log
+from core.middleware import SlowRequestMiddleware, QueryProfileMiddleware, RequestLogMiddleware
 
 
 @asynccontextmanager
 async def lifespan(_):
     """"前置和后置事件"""
+    await warmup_engines()
+    request_log.start()
+    start_batch_writers()
+    invalidation_listener = start_invalidation_listener()
+    warmup = start_warmup()
+    if warmup is not None and setting.cache_warmup_blocking:
+        # 预热完成后才开始接收请求
+        await warmup
     yield
-    if redis is not None:
-        await redis.close()
+    if warmup is not None:
+        warmup.cancel()
+    if invalidation_listener is not None:
+        invalidation_listener.cancel()
+    await cache.close()
+    # 写完队列中的操作日志后再关闭数据库连接
+    await stop_batch_writers()
+    await dispose_engines()
+    await request_log.stop()
 
 
 def create_app() -> FastAPI:
     """初始化app实例，注册各种扩展"""
-    application = FastAPI(lifespan=lifespan)
+    application = FastAPI(lifespan=lifespan, default_response_class=ModelResponse)
+    setup_slow_query_log()
     register_api(application)
     register_exception_handler(application)
 
-    # middleware
-    application.middleware('http')(SlowRequestMiddleware())
-    application.middleware('http')(log_request)
+    # middleware, 后添加的在外层
+    application.add_middleware(SlowRequestMiddleware)
+    application.add_middleware(RequestLogMiddleware, body_limit=setting.log_body_limit)
+    if setting.database_profile:
+        application.add_middleware(QueryProfileMiddleware, n_plus_one_threshold=setting.database_profile_n_plus_one)
 
     return application
 
@@ -36,17 +59,17 @@ def register_exception_handler(application: FastAPI):
     @application.exception_handler(RequestValidationError)
     async def validation_exception_handler(_, exc):
         logger.exception('request validation error', exc)
-        return JSONResponse(BaseResponse(code=ResponseCode.BAD_REQUEST, msg=str(exc)).model_dump())
+        return ModelResponse(BaseResponse(code=ResponseCode.BAD_REQUEST, msg=str(exc)))
 
     @application.exception_handler(ApiException)
     async def api_exception_handler(_, e):
-        return JSONResponse(BaseResponse(code=e.code, msg=e.msg).dict())
+        return ModelResponse(BaseResponse(code=e.code, msg=e.msg))
 
     @application.exception_handler(Exception)
     async def base_exception_handler(_, e):
         logger.exception('request error')
         message = e.msg if hasattr(e, 'message') else ''
-        return JSONResponse(BaseResponse(code=ResponseCode.SYSTEM_ERROR, msg=message).dict())
+        return ModelResponse(BaseResponse(code=ResponseCode.SYSTEM_ERROR, msg=message))
 
 
 def register_api(application: FastAPI):
@@ -59,6 +82,8 @@ def register_api(application: FastAPI):
     from modules.system.notice_api import api as notice_api
     from modules.system.menu_api import api as menu_api
     from modules.system.config_api import api as config_api
+    from modules.monitor.monitor_api import api as monitor_api
+    import modules.system.oper_log_service  # noqa: F401 注册操作日志记录
 
     application.include_router(auth_api)
     application.include_router(user_api)
@@ -69,6 +94,7 @@ def register_api(application: FastAPI):
     application.include_router(notice_api)
     application.include_router(menu_api)
     application.include_router(config_api)
+    application.include_router(monitor_api)
 
 
 app = create_app()
@@ -0,0 +1,44 @@
+"""
+每个请求的认证开销: 每次HS256验签 vs 已验证token缓存
+运行: python -m benchmarks.bench_auth
+"""
+import os
+import time
+
+os.environ.setdefault('DATABASE_URI', 'sqlite+aiosqlite://')
+
+import jwt as pyjwt  # noqa: E402
+
+from setting import setting  # noqa: E402
+from core.depends import get_jwt_token  # noqa: E402
+from core.jwt import jwt_encode, jwt_decode  # noqa: E402
+
+REQUESTS = 100000
+
+
+def decode_every_time(authorization: str):
+    token = get_jwt_token(authorization)
+    return pyjwt.decode(token, key=setting.token_secret, algorithms='HS256')['user_id']
+
+
+def decode_cached(authorization: str):
+    return jwt_decode(get_jwt_token(authorization))['user_id']
+
+
+def measure(func, authorization: str) -> float:
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        func(authorization)
+    return (time.perf_counter() - start) / REQUESTS * 1e6
+
+
+def main():
+    authorization = 'Bearer ' + jwt_encode(dict(user_id=2), setting.token_timeout)
+    before = measure(decode_every_time, authorization)
+    after = measure(decode_cached, authorization)
+    print(f'{"decode(us/request)":>19} {"cached(us/request)":>19} {"speedup":>8}')
+    print(f'{before:>19.2f} {after:>19.2f} {before / after:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+缓存值大小和命中时的解码耗时: JSON字符串 vs codec编码(超过阈值压缩), 字典数据额外对比直接写入响应
+运行: python -m benchmarks.bench_codec
+"""
+import json
+import os
+import time
+
+os.environ.setdefault('DATABASE_URI', 'sqlite+aiosqlite://')
+
+from core.codec import Codec, msgpack  # noqa: E402
+from core.schema import BaseResponse, ModelResponse, RawDataResponse, list_adapter  # noqa: E402
+from modules.system.sys_dict_service import SysDictDataDTO  # noqa: E402
+
+ROUNDS = 2000
+
+
+def measure(func, *args) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(*args)
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+
+def dict_hit_before(cache_str: str):
+    """改造前: 解析校验为DTO, 再序列化为响应"""
+    return ModelResponse(BaseResponse(data=list_adapter(SysDictDataDTO).validate_json(cache_str)))
+
+
+def dict_hit_raw(codec: Codec, data: bytes):
+    return RawDataResponse(codec.decode_json(data))
+
+
+def main():
+    codecs = [('json', Codec('json', 0)), ('json+zlib', Codec('json', 1024))]
+    if msgpack is not None:
+        codecs.append(('msgpack+zlib', Codec('msgpack', 1024)))
+
+    print(f'{"value":>22} {"codec":>13} {"bytes":>8} {"saved":>6} {"hit(us)":>8} {"before(us)":>11}')
+    for n in (10, 100, 1000):
+        rows = [SysDictDataDTO(dict_code=i, dict_sort=i, dict_label=f'标签{i}', dict_value=str(i), dict_type='bench',
+                               css_class='', list_class='default', is_default='N', status='0')
+                for i in range(n)]
+        before = json.dumps([row.model_dump() for row in rows], default=str)
+        before_us = measure(dict_hit_before, before)
+        for name, codec in codecs:
+            data = codec.encode(rows)
+            print(f'{"dict data x" + str(n):>22} {name:>13} {len(data):>8} '
+                  f'{1 - len(data) / len(before.encode()):>6.0%} {measure(dict_hit_raw, codec, data):>8.1f} '
+                  f'{before_us:>11.1f}')
+
+    for n in (50, 500):
+        tokens = [f'system:module{i}:list' for i in range(n)]
+        before = json.dumps(tokens)
+        before_us = measure(json.loads, before)
+        for name, codec in codecs:
+            data = codec.encode(tokens)
+            print(f'{"permission tokens x" + str(n):>22} {name:>13} {len(data):>8} '
+                  f'{1 - len(data) / len(before.encode()):>6.0%} {measure(codec.decode, data):>8.1f} '
+                  f'{before_us:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
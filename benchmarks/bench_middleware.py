@@ -0,0 +1,115 @@
+"""
+中间件的单次请求开销: BaseHTTPMiddleware包装的函数中间件 vs 纯ASGI中间件
+直接调用ASGI应用, 不经过网络和HTTP客户端
+运行: python -m benchmarks.bench_middleware
+"""
+import asyncio
+import os
+import time
+
+os.environ.setdefault('DATABASE_URI', 'sqlite+aiosqlite://')
+
+from fastapi import FastAPI, Request  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from core.middleware import SlowRequestMiddleware, RequestLogMiddleware  # noqa: E402
+from core.profiler import current_endpoint  # noqa: E402
+from core.schema import BaseResponse, ModelResponse, ModelRoute  # noqa: E402
+
+REQUESTS = 3000
+
+
+class OldSlowRequestMiddleware(object):
+    """改造前的实现"""
+
+    def __init__(self, limit=1):
+        self.limit = limit
+
+    async def __call__(self, request: Request, call_next):
+        start_time = time.time()
+        token = current_endpoint.set(f'{request.method} {request.url.path}')
+        try:
+            response = await call_next(request)
+        finally:
+            current_endpoint.reset(token)
+        process_time = time.time() - start_time
+        if process_time > self.limit:
+            logger.warning(f'{request.url.path}[{request.method}]---{process_time}')
+        return response
+
+
+async def old_log_request(request: Request, call_next):
+    start_time = time.time()
+    request_body = await request.body() if request.method in ["POST", "PUT"] else None
+    request_params = str(request.query_params) if request.query_params else None
+    response = await call_next(request)
+    process_time = time.time() - start_time
+    response_body = getattr(response, 'body', None)
+    logger.info(f"Request: {request.method} {request.url.path} Params: {request_params} Body: {request_body}")
+    logger.opt(lazy=True).info("Response: {} Body: {}", lambda: response.status_code,
+                               lambda: response_body.decode('utf-8', 'replace') if response_body else None)
+    logger.info(f"Processing time: {process_time:.2f} seconds")
+    return response
+
+
+def make_app(middleware: str) -> FastAPI:
+    app = FastAPI(default_response_class=ModelResponse)
+    app.router.route_class = ModelRoute
+
+    @app.get('/items')
+    async def items():
+        return BaseResponse(data=[dict(id=i, name=f'item{i}') for i in range(20)])
+
+    @app.post('/items')
+    async def create(request: Request):
+        return BaseResponse(data=len(await request.body()))
+
+    if middleware == 'BaseHTTPMiddleware':
+        app.middleware('http')(OldSlowRequestMiddleware())
+        app.middleware('http')(old_log_request)
+    elif middleware == 'ASGI':
+        app.add_middleware(SlowRequestMiddleware)
+        app.add_middleware(RequestLogMiddleware)
+    return app
+
+
+async def call(app, method: str, body: bytes):
+    scope = dict(type='http', asgi=dict(version='3.0'), http_version='1.1', method=method, scheme='http',
+                 path='/items', raw_path=b'/items', query_string=b'page=1', root_path='',
+                 headers=[(b'host', b'bench'), (b'content-length', str(len(body)).encode())],
+                 client=('127.0.0.1', 1), server=('bench', 80))
+    messages = [dict(type='http.request', body=body, more_body=False)]
+
+    async def receive():
+        return messages.pop() if messages else dict(type='http.disconnect')
+
+    async def send(_):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def measure(app, method: str, body: bytes) -> float:
+    for _ in range(100):
+        await call(app, method, body)
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await call(app, method, body)
+    return (time.perf_counter() - start) / REQUESTS * 1e6
+
+
+async def main():
+    # 只比较中间件开销, 日志不输出
+    logger.remove()
+    cases = [('GET', b''), ('POST 1KB', b'x' * 1024), ('POST 256KB', b'x' * 256 * 1024)]
+    print(f'{"request":>11} {"none(us)":>9} {"BaseHTTP(us)":>13} {"ASGI(us)":>9} {"overhead before":>16} '
+          f'{"overhead after":>15}')
+    apps = {name: make_app(name) for name in ('none', 'BaseHTTPMiddleware', 'ASGI')}
+    for name, body in cases:
+        method = name.split()[0]
+        none, before, after = [await measure(app, method, body) for app in apps.values()]
+        print(f'{name:>11} {none:>9.1f} {before:>13.1f} {after:>9.1f} {before - none:>16.1f} {after - none:>15.1f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""
+操作日志写入: 请求中逐条INSERT并提交 vs 放入队列由后台批量写入
+对比每个请求额外的耗时, 以及后台批量写入的吞吐量
+运行: python -m benchmarks.bench_oper_log
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+# 文件数据库, 每次提交都会写盘, 和实际部署一样
+os.environ.setdefault('DATABASE_URI', f'sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench_oper_log.db')
+os.environ.setdefault('OPER_LOG_ENABLED', 'true')
+
+from loguru import logger  # noqa: E402
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from core.depends import AuthContext  # noqa: E402
+from core.db import Base, engine, async_session  # noqa: E402
+from core.request_log import RequestLogRecord  # noqa: E402
+from modules.system.oper_log_service import insert_oper_logs, oper_log_writer, record_oper_log  # noqa: E402
+from modules.system.table import SysOperLog, SysUser, SysDept  # noqa: E402
+
+REQUESTS = 2000
+
+
+async def create_post_endpoint():
+    pass
+
+
+def make_request(i: int):
+    scope = dict(type='http', method='POST', path='/system/post', state=dict(auth=AuthContext('token', 1)),
+                 endpoint=create_post_endpoint, client=('127.0.0.1', 1))
+    record = RequestLogRecord('POST', '/system/post', None, 200, 0.001,
+                              f'{{"postCode":"code{i}","postName":"岗位{i}","postSort":1,"status":"0"}}',
+                              '{"code":200,"msg":"","data":null}')
+    return scope, record
+
+
+async def count_rows() -> int:
+    async with async_session() as session:
+        return await session.scalar(select(func.count()).select_from(SysOperLog))
+
+
+async def inline(requests) -> float:
+    """改造前: 请求中写入一条并提交"""
+    start = time.perf_counter()
+    for scope, record in requests:
+        await insert_oper_logs([dict(record=record, user_id=scope['state']['auth'].user_id,
+                                     endpoint='modules.system.post_api.create_post_endpoint', ip='127.0.0.1')])
+    return (time.perf_counter() - start) / len(requests) * 1e6
+
+
+async def queued(requests):
+    """请求中只放入队列, 返回每个请求的耗时(us)和后台写完所有记录的吞吐量(条/秒)"""
+    oper_log_writer.start()
+    start = time.perf_counter()
+    for scope, record in requests:
+        record_oper_log(scope, record)
+    per_request = (time.perf_counter() - start) / len(requests) * 1e6
+    await oper_log_writer.stop()
+    return per_request, len(requests) / (time.perf_counter() - start)
+
+
+async def main():
+    logger.remove()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(SysDept).values(dept_id=1, parent_id=0, ancestors='0', dept_name='研发部门',
+                                                  create_by='1'))
+        await conn.execute(insert(SysUser).values(user_id=1, dept_id=1, user_name='admin', password='x',
+                                                  create_by='1'))
+    requests = [make_request(i) for i in range(REQUESTS)]
+
+    inline_us = await inline(requests)
+    before = await count_rows()
+    queued_us, throughput = await queued(requests)
+    assert await count_rows() - before == REQUESTS
+
+    print(f'{"write":>8} {"per request(us)":>16} {"rows/s":>10}')
+    print(f'{"inline":>8} {inline_us:>16.1f} {1e6 / inline_us:>10.0f}')
+    print(f'{"batched":>8} {queued_us:>16.1f} {throughput:>10.0f}')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
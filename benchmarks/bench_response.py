@@ -0,0 +1,62 @@
+"""
+响应序列化性能对比: FastAPI默认的jsonable_encoder + JSONResponse vs core.schema.ModelResponse
+运行: python -m benchmarks.bench_response
+"""
+import os
+import random
+import time
+from datetime import datetime
+
+os.environ.setdefault('DATABASE_URI', 'sqlite+aiosqlite://')
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from core.schema import BaseResponse, TableDataInfo, ModelResponse  # noqa: E402
+from core.tree import build_tree  # noqa: E402
+from modules.system.menu_service import SysMenuDTO  # noqa: E402
+from modules.system.user_service import SysUserDTO  # noqa: E402
+
+ROUNDS = 5
+
+
+def make_menu_tree(n: int) -> BaseResponse:
+    now = datetime.now()
+    menus = [SysMenuDTO(menu_id=i, parent_id=0 if i == 1 else random.randint(1, i - 1), menu_name=f'菜单{i}',
+                        order_num=i, path=f'path{i}', perms=f'system:menu{i}:list', menu_type='C', status='0',
+                        create_time=now) for i in range(1, n + 1)]
+    return BaseResponse(data=build_tree(menus, id_key='menu_id'))
+
+
+def make_user_page(n: int) -> TableDataInfo:
+    now = datetime.now()
+    rows = [SysUserDTO(user_id=i, dept_id=100, user_name=f'user{i}', nick_name=f'用户{i}',
+                       email=f'user{i}@example.com', phonenumber='13800000000', create_time=now)
+            for i in range(1, n + 1)]
+    return TableDataInfo(rows=rows, total=n * 10, next_cursor='MTAw')
+
+
+def measure(func, content) -> float:
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(content)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    random.seed(0)
+    print(f'{"content":>16} {"jsonable_encoder(ms)":>21} {"ModelResponse(ms)":>18} {"speedup":>8}')
+    cases = [('menu tree 1000', make_menu_tree(1000)), ('menu tree 10000', make_menu_tree(10000)),
+             ('user page 500', make_user_page(500)), ('user page 5000', make_user_page(5000))]
+    for name, content in cases:
+        assert JSONResponse(jsonable_encoder(content)).body == ModelResponse(content).body
+        before = measure(lambda c: JSONResponse(jsonable_encoder(c)), content)
+        after = measure(ModelResponse, content)
+        print(f'{name:>16} {before:>21.2f} {after:>18.2f} {before / after:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
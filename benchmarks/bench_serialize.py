@@ -0,0 +1,69 @@
+"""
+列表序列化性能对比: ORM实体逐行model_validate vs 只查DTO列后TypeAdapter整体校验
+运行: python -m benchmarks.bench_serialize
+"""
+import asyncio
+import os
+import time
+
+os.environ.setdefault('DATABASE_URI', 'sqlite+aiosqlite://')
+
+from sqlalchemy import select, insert  # noqa: E402
+
+from core.db import Base, engine, async_session, find_dto_list  # noqa: E402
+from modules.system.table import SysUser, SysMenu, SysDictData  # noqa: E402
+from modules.system.user_service import SysUserDTO  # noqa: E402
+from modules.system.menu_service import SysMenuDTO  # noqa: E402
+from modules.system.sys_dict_service import SysDictDataDTO  # noqa: E402
+
+ROUNDS = 5
+
+
+def make_rows(n: int):
+    users = [dict(user_id=i, dept_id=100, user_name=f'user{i}', nick_name=f'用户{i}', password='x',
+                  email=f'user{i}@example.com', phonenumber='13800000000', create_by='1') for i in range(1, n + 1)]
+    menus = [dict(menu_id=i, menu_name=f'菜单{i}', parent_id=i // 10, order_num=i, path=f'path{i}',
+                  perms=f'system:menu{i}:list', menu_type='C', create_by='1') for i in range(1, n + 1)]
+    dict_data = [dict(dict_code=i, dict_sort=i, dict_label=f'标签{i}', dict_value=str(i), dict_type='bench',
+                      create_by='1') for i in range(1, n + 1)]
+    return [(SysUser, SysUserDTO, users), (SysMenu, SysMenuDTO, menus), (SysDictData, SysDictDataDTO, dict_data)]
+
+
+async def orm_model_validate(entity, dto_type):
+    async with async_session() as session:
+        records = (await session.scalars(select(entity))).fetchall()
+        return [dto_type.model_validate(e, from_attributes=True) for e in records]
+
+
+async def dto_list(entity, dto_type):
+    async with async_session() as session:
+        return await find_dto_list(select(entity), dto_type, session)
+
+
+async def measure(func, *args) -> float:
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        await func(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+async def main():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    print(f'{"table":>14} {"rows":>6} {"model_validate(ms)":>19} {"dto_list(ms)":>13} {"speedup":>8}')
+    for n in (500, 5000):
+        for entity, dto_type, rows in make_rows(n):
+            async with engine.begin() as conn:
+                await conn.execute(entity.__table__.delete())
+                await conn.execute(insert(entity), rows)
+            before = await measure(orm_model_validate, entity, dto_type)
+            after = await measure(dto_list, entity, dto_type)
+            print(f'{entity.__tablename__:>14} {n:>6} {before:>19.2f} {after:>13.2f} {before / after:>7.1f}x')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+缓存冷启动时的并发请求: 各自查库回填 vs single-flight, 统计数据库查询次数
+运行: python -m benchmarks.bench_stampede
+"""
+import asyncio
+import os
+import time
+
+os.environ.setdefault('DATABASE_URI', 'sqlite+aiosqlite://')
+
+from sqlalchemy import event, insert, select  # noqa: E402
+
+from core.cache import cache  # noqa: E402
+from core.db import Base, engine, async_session, find_dto_list  # noqa: E402
+from core.schema import list_adapter  # noqa: E402
+from modules.system import sys_dict_service, config_service  # noqa: E402
+from modules.system.sys_dict_service import SysDictDataDTO  # noqa: E402
+from modules.system.table import SysDictData, SysConfig  # noqa: E402
+
+CONCURRENCY = 200
+query_count = 0
+
+
+def count_query(*_):
+    global query_count
+    query_count += 1
+
+
+async def find_dict_data_without_single_flight(dict_type: str, session):
+    """改造前的读取方式: 未命中时每个请求都查库"""
+    cache_key = await cache.namespace_key(sys_dict_service.REDIS_NAMESPACE, f'find_dict_data_by_type:{dict_type}')
+    cache_value_str = await cache.get(cache_key)
+    if cache_value_str is not None:
+        return list_adapter(SysDictDataDTO).validate_json(cache_value_str)
+    result_list = await find_dto_list(
+        select(SysDictData).where(SysDictData.dict_type == dict_type), SysDictDataDTO, session)
+    await cache.set(cache_key, list_adapter(SysDictDataDTO).dump_json(result_list), ex=3600)
+    return result_list
+
+
+async def find_config_without_single_flight(config_key: str, session):
+    cache_key = await cache.namespace_key(config_service.CACHE_NAMESPACE, f'get_config_key:{config_key}')
+    cache_value = await cache.get(cache_key)
+    if cache_value is not None:
+        return cache_value
+    value = (await session.scalars(select(SysConfig.config_value).where(
+        SysConfig.config_key == config_key))).one_or_none()
+    await cache.set(cache_key, value, ex=3600)
+    return value
+
+
+async def request(func, key):
+    async with async_session() as session:
+        return await func(key, session)
+
+
+async def burst(func, key):
+    """清空缓存后同时发起CONCURRENCY个请求"""
+    global query_count
+    await cache.purge_namespace(sys_dict_service.REDIS_NAMESPACE)
+    await cache.purge_namespace(config_service.CACHE_NAMESPACE)
+    query_count = 0
+    start = time.perf_counter()
+    await asyncio.gather(*[request(func, key) for _ in range(CONCURRENCY)])
+    return query_count, (time.perf_counter() - start) * 1000
+
+
+async def main():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(SysDictData), [
+            dict(dict_code=i, dict_sort=i, dict_label=f'标签{i}', dict_value=str(i), dict_type='bench', create_by='1')
+            for i in range(1, 51)])
+        await conn.execute(insert(SysConfig), [
+            dict(config_id=1, config_name='bench', config_key='bench.key', config_value='value', create_by='1')])
+    event.listen(engine.sync_engine, 'before_cursor_execute', count_query)
+
+    print(f'{"cold burst x" + str(CONCURRENCY):>26} {"queries":>8} {"ms":>8}')
+    cases = [
+        ('dict / no single-flight', find_dict_data_without_single_flight, 'bench'),
+        ('dict / single-flight', lambda key, _: sys_dict_service.find_dict_data_by_type(key), 'bench'),
+        ('config / no single-flight', find_config_without_single_flight, 'bench.key'),
+        ('config / single-flight', lambda key, _: config_service.get_config_key(key), 'bench.key'),
+    ]
+    for name, func, key in cases:
+        queries, elapsed = await burst(func, key)
+        print(f'{name:>26} {queries:>8} {elapsed:>8.1f}')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""
+树组装性能对比: 原来逐节点扫描全表的O(n^2)实现 vs core.tree.build_tree
+运行: python -m benchmarks.bench_tree
+"""
+import random
+import time
+
+from core.schema import TreeSelect
+from core.tree import build_tree
+
+
+class Node:
+    def __init__(self, id, parent_id):
+        self.id = id
+        self.parent_id = parent_id
+        self.label = f'node{id}'
+
+
+def make_nodes(n: int):
+    # 每个节点的父节点在它之前随机选取, 生成一棵随机树
+    return [Node(i, 0 if i == 1 else random.randint(1, i - 1)) for i in range(1, n + 1)]
+
+
+def quadratic_build_tree(data_list):
+    tree_data_list = [TreeSelect(id=d.id, label=d.label, parent_id=d.parent_id, children=[]) for d in data_list]
+    for tree_data in tree_data_list:
+        tree_data.children = [child for child in tree_data_list if child.parent_id == tree_data.id]
+    return [tree_data for tree_data in tree_data_list if tree_data.parent_id == 0]
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    random.seed(0)
+    print(f'{"nodes":>8} {"quadratic(ms)":>14} {"TreeSelect(ms)":>15} {"build_tree(ms)":>15}')
+    for n in (1000, 5000, 10000, 100000):
+        nodes = make_nodes(n)
+        quadratic = f'{measure(quadratic_build_tree, nodes):.1f}' if n <= 10000 else '-'
+        tree_select = measure(TreeSelect.build_tree, nodes)
+        raw = measure(build_tree, make_nodes(n))
+        print(f'{n:>8} {quadratic:>14} {tree_select:>15.1f} {raw:>15.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from core.metrics import Counter, Histogram, register_collector
+
+batch_writer_items = Counter('batch_writer_items_total', 'Items handled by background batch writers',
+                             ['writer', 'result'])
+batch_writer_flush_seconds = Histogram('batch_writer_flush_seconds', 'Time spent flushing one batch', ['writer'])
+batch_writer_batch_size = Histogram('batch_writer_batch_size', 'Items per flushed batch', ['writer'],
+                                    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+# 名称 -> 批量写入器
+batch_writers: Dict[str, 'BatchWriter'] = {}
+_STOP = object()
+
+
+class BatchWriter(object):
+    """
+    后台批量写入. put不等待, 放入有界队列, 队列满时丢弃并计数;
+    后台任务每攒够batch_size条或距第一条超过flush_interval秒调用一次flush, 关闭时写完队列中剩余的数据
+    """
+
+    def __init__(self, name: str, flush: Callable[[List[Any]], Awaitable[None]], batch_size: int = 100,
+                 flush_interval: float = 1.0, maxsize: int = 10000):
+        self.name = name
+        self.flush = flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        # 队列达到过的最大长度
+        self.high_water = 0
+        self._task: Optional[asyncio.Task] = None
+        batch_writers[name] = self
+
+    def put(self, item: Any) -> bool:
+        """放入队列, 返回是否放入"""
+        if self._task is None:
+            batch_writer_items.inc(writer=self.name, result='dropped')
+            return False
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            batch_writer_items.inc(writer=self.name, result='dropped')
+            return False
+        batch_writer_items.inc(writer=self.name, result='queued')
+        self.high_water = max(self.high_water, self.queue.qsize())
+        return True
+
+    async def _flush(self, batch: List[Any]) -> None:
+        start = time.perf_counter()
+        try:
+            await self.flush(batch)
+            batch_writer_items.inc(len(batch), writer=self.name, result='written')
+        except Exception:
+            batch_writer_items.inc(len(batch), writer=self.name, result='failed')
+            logger.exception(f'batch writer {self.name} flush failed')
+        batch_writer_flush_seconds.observe(time.perf_counter() - start, writer=self.name)
+        batch_writer_batch_size.observe(len(batch), writer=self.name)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    item = self.queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self.queue.get(),
+                                                                                               timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+        # 停止前放入队列的数据按批写完
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+            if len(batch) >= self.batch_size:
+                await self._flush(batch)
+                batch = []
+        if batch:
+            await self._flush(batch)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止接收并等待队列写完"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        await self.queue.put(_STOP)
+        await task
+
+    def stats(self) -> dict:
+        return dict(name=self.name, queue_size=self.queue.qsize(), maxsize=self.queue.maxsize,
+                    high_water=self.high_water, running=self._task is not None)
+
+
+def start_batch_writers() -> None:
+    for writer in batch_writers.values():
+        writer.start()
+
+
+async def stop_batch_writers() -> None:
+    await asyncio.gather(*[writer.stop() for writer in batch_writers.values()])
+
+
+@register_collector
+def _collect_batch_writer_metrics():
+    stats = [writer.stats() for writer in batch_writers.values()]
+    yield 'batch_writer_queue_size', 'gauge', 'Items waiting in batch writer queues', [
+        (dict(writer=item['name']), item['queue_size']) for item in stats]
+    yield 'batch_writer_queue_high_water', 'gauge', 'Largest queue size seen by batch writers', [
+        (dict(writer=item['name']), item['high_water']) for item in stats]
@@ -0,0 +1,613 @@
+import asyncio
+import json
+import struct
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session as SyncSession
+
+from setting import setting
+from core.codec import codec
+from core.metrics import Counter as MetricCounter, Histogram, register_collector
+from core.redis import redis
+
+# 缓存失效通知频道, 每个进程订阅后清理自己的本地缓存
+INVALIDATE_CHANNEL = 'cache_invalidate'
+# namespace代数的key前缀, 不在namespace下, 清理namespace时不会被删除
+GENERATION_PREFIX = 'cache_generation'
+# 跨进程填充锁的key前缀
+FILL_LOCK_PREFIX = 'cache_fill_lock'
+# 条目开头的软过期时间戳
+SOFT_EXPIRE = struct.Struct('>d')
+# 各key的访问次数超过这个数量时清空, 避免无限增长
+ACCESS_COUNT_SIZE = 10000
+_MISSING = object()
+
+# namespace -> 本地缓存
+local_caches: Dict[str, 'LRUCache'] = {}
+
+cache_fill_seconds = Histogram('cache_fill_seconds', 'Time spent loading a missing or stale cache entry',
+                               ['namespace'])
+cache_payload_bytes = Histogram('cache_payload_bytes', 'Size of encoded cache entries written',
+                                ['namespace'], buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576))
+cache_invalidations = MetricCounter('cache_invalidations_total', 'Cache invalidations by namespace and kind',
+                                    ['namespace', 'kind'])
+
+
+class LRUCache:
+    """进程内LRU缓存, 超过maxsize淘汰最久未使用的条目, 条目ttl秒后过期"""
+
+    def __init__(self, namespace: str, maxsize: int = 1024, ttl: float = 60):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (过期时间, 值)
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            self.misses += 1
+            return default
+        expire_time, value = item
+        if expire_time < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def keys(self) -> List[Hashable]:
+        return list(self._data.keys())
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] >= time.monotonic()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return dict(namespace=self.namespace, size=len(self._data), maxsize=self.maxsize, ttl=self.ttl,
+                    hits=self.hits, misses=self.misses, evictions=self.evictions, expirations=self.expirations,
+                    hit_rate=round(self.hits / total, 4) if total else 0.0)
+
+
+def register_local_cache(local_cache: LRUCache) -> LRUCache:
+    """登记到local_caches, 由失效通知和缓存监控使用, 同一个namespace只能登记一次"""
+    if local_cache.namespace in local_caches:
+        raise ValueError(f'local cache {local_cache.namespace} already registered')
+    local_caches[local_cache.namespace] = local_cache
+    return local_cache
+
+
+def get_local_cache_stats() -> List[dict]:
+    return [cache.stats() for cache in local_caches.values()]
+
+
+def get_cache_stats() -> dict:
+    """进程内缓存、缓存后端各namespace的读取和刷新、single-flight统计"""
+    return dict(local=get_local_cache_stats(), fill=cache.fill_stats(), single_flight=single_flight.stats(),
+                thrashing_keys=cache.thrashing_keys())
+
+
+def _namespace(key: str) -> str:
+    return key.split(':', 1)[0]
+
+
+class SingleFlight:
+    """同一个key同时只有一个协程执行加载, 其他协程等待同一个结果"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.loads = 0
+        self.shared = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.loads += 1
+            task = self._calls[key] = asyncio.get_running_loop().create_task(func())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+        # 等待的协程被取消时不影响加载, 其他协程仍能拿到结果
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return dict(in_flight=len(self._calls), loads=self.loads, shared=self.shared)
+
+
+single_flight = SingleFlight()
+
+
+def pack_entry(payload: bytes, soft_expire: float) -> bytes:
+    """编码后的值前面加上软过期时间戳"""
+    return SOFT_EXPIRE.pack(soft_expire) + payload
+
+
+def unpack_entry(entry: bytes) -> Tuple[float, bytes]:
+    return SOFT_EXPIRE.unpack_from(entry)[0], entry[SOFT_EXPIRE.size:]
+
+
+class CacheBackend:
+    """
+    缓存后端, 值为bytes, 写入str时按UTF-8编码, ex为过期秒数.
+    namespace下的key带代数 namespace:代数:key, 失效时代数加一, 旧代数的key不再被读取, 等待过期
+    """
+    # 是否多进程共享, 共享时本地缓存需要通过发布订阅通知失效
+    distributed = False
+
+    def __init__(self):
+        # namespace -> (过期时间, 代数), 代数在进程内缓存cache_generation_ttl秒
+        self._generations: Dict[str, Tuple[float, int]] = {}
+        # namespace -> 命中、过期、未命中、刷新次数
+        self._fill_counters: Dict[str, Counter] = {}
+        # key -> 上次加载后的命中次数, 用于判断是否提前刷新
+        self._access_counts: Dict[str, int] = {}
+        # key -> 加载次数, 加载次数多的key可能TTL太短或者频繁失效
+        self._key_fills: Counter = Counter()
+        self._refresh_tasks = set()
+        # 事务提交后还未完成的namespace失效
+        self._pending_invalidations = set()
+
+    async def generation(self, namespace: str) -> int:
+        if self._pending_invalidations:
+            await asyncio.gather(*list(self._pending_invalidations), return_exceptions=True)
+        item = self._generations.get(namespace)
+        if item is not None and item[0] >= time.monotonic():
+            return item[1]
+        generation = int(await self.get(f'{GENERATION_PREFIX}:{namespace}') or 0)
+        self._generations[namespace] = (time.monotonic() + setting.cache_generation_ttl, generation)
+        return generation
+
+    async def namespace_key(self, namespace: str, key: str) -> str:
+        return f'{namespace}:{await self.generation(namespace)}:{key}'
+
+    async def invalidate_namespace(self, namespace: str) -> int:
+        """namespace代数加一, 一次INCR使整个namespace失效"""
+        cache_invalidations.inc(namespace=namespace, kind='generation')
+        generation = await self.incr(f'{GENERATION_PREFIX}:{namespace}')
+        self._generations[namespace] = (time.monotonic() + setting.cache_generation_ttl, generation)
+        return generation
+
+    def invalidate_namespace_later(self, namespace: str) -> None:
+        """在后台使namespace失效, 完成前本进程读取代数时等待"""
+        task = asyncio.get_running_loop().create_task(self.invalidate_namespace(namespace))
+        self._pending_invalidations.add(task)
+        task.add_done_callback(self._pending_invalidations.discard)
+
+    async def purge_namespace(self, namespace: str) -> None:
+        """使namespace失效并立即删除所有代数的key, 用于手动刷新缓存"""
+        cache_invalidations.inc(namespace=namespace, kind='purge')
+        await self.invalidate_namespace(namespace)
+        keys = await self.namespace_keys(namespace)
+        if keys:
+            await self.delete(*keys)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        raise NotImplementedError
+
+    async def get_or_fill(self, key: str, loader: Callable[[], Awaitable[Any]], ex: Optional[int] = None,
+                          soft_ttl: Optional[float] = None, refresh: Optional[Callable[[], Awaitable[Any]]] = None,
+                          raw: bool = False) -> Any:
+        """
+        读取缓存, 未命中时调用loader加载并写入, 值用codec编码, raw为True时返回JSON原文.
+        loader返回None时写入cache_negative_ttl秒的负缓存条目, 期间直接返回None, 和正常条目一样随namespace失效.
+        同一进程内每个key只有一个协程加载, 配置了cache_fill_lock_ms时多进程间用SET NX PX加锁,
+        未拿到锁的进程等待持有锁的进程写入, 锁过期后自己加载.
+        条目超过soft_ttl秒后直接返回旧值并在后台调用refresh刷新, 访问频繁的条目在软过期前cache_refresh_ahead秒提前刷新.
+        refresh为None时软过期的条目同步加载. loader由等待的协程共用, refresh在请求结束后运行,
+        发起加载的请求结束或取消后仍可能在运行, 都不能使用请求的数据库会话
+        """
+        soft_ttl = setting.cache_soft_ttl if soft_ttl is None else soft_ttl
+        counter = self._fill_counter(key)
+        entry = await self.get(key)
+        if entry is None:
+            counter['misses'] += 1
+            # 等待的协程共享编码后的条目, 各自解码, 不会共用同一个可变对象
+            entry = await single_flight.do(key, lambda: self._fill(key, loader, ex, soft_ttl))
+        else:
+            remaining = unpack_entry(entry)[0] - time.time()
+            if remaining <= 0 and refresh is None:
+                counter['misses'] += 1
+                entry = await single_flight.do(key, lambda: self._load(key, loader, ex, soft_ttl))
+            elif remaining <= 0:
+                counter['stale'] += 1
+                self._refresh(key, refresh, ex, soft_ttl)
+            else:
+                counter['hits'] += 1
+                if len(entry) == SOFT_EXPIRE.size:
+                    counter['negative_hits'] += 1
+                if refresh is not None and remaining <= setting.cache_refresh_ahead:
+                    count = self._access_counts[key] = self._access_counts.get(key, 0) + 1
+                    if count >= setting.cache_refresh_ahead_hits and ('refresh', key) not in single_flight:
+                        counter['refresh_ahead'] += 1
+                        self._refresh(key, refresh, ex, soft_ttl)
+        if entry is None:
+            return None
+        payload = unpack_entry(entry)[1]
+        if not payload:
+            return None
+        return codec.decode_json(payload) if raw else codec.decode(payload)
+
+    def _fill_counter(self, key: str) -> Counter:
+        namespace = _namespace(key)
+        counter = self._fill_counters.get(namespace)
+        if counter is None:
+            counter = self._fill_counters[namespace] = Counter()
+        return counter
+
+    async def _fill(self, key: str, loader: Callable[[], Awaitable[Any]], ex: Optional[int],
+                    soft_ttl: float) -> Optional[bytes]:
+        # 排队期间可能已经被其他协程写入
+        entry = await self.get(key)
+        if entry is not None:
+            return entry
+        lock_ms = setting.cache_fill_lock_ms
+        if not self.distributed or lock_ms <= 0:
+            return await self._load(key, loader, ex, soft_ttl)
+        lock_key, token = f'{FILL_LOCK_PREFIX}:{key}', uuid.uuid4().hex
+        deadline = time.monotonic() + lock_ms / 1000
+        while not await self.set(lock_key, token, px=lock_ms, nx=True):
+            await asyncio.sleep(setting.cache_fill_lock_wait)
+            entry = await self.get(key)
+            if entry is not None:
+                return entry
+            if time.monotonic() >= deadline:
+                return await self._load(key, loader, ex, soft_ttl)
+        try:
+            return await self._load(key, loader, ex, soft_ttl)
+        finally:
+            await self.release_lock(lock_key, token)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ex: Optional[int],
+                    soft_ttl: float) -> Optional[bytes]:
+        """加载并写入, 返回编码后的条目"""
+        start = time.perf_counter()
+        value = await loader()
+        cache_fill_seconds.observe(time.perf_counter() - start, namespace=_namespace(key))
+        self._access_counts.pop(key, None)
+        self._key_fills[key] += 1
+        if len(self._access_counts) > ACCESS_COUNT_SIZE:
+            self._access_counts.clear()
+        if len(self._key_fills) > ACCESS_COUNT_SIZE:
+            self._key_fills.clear()
+        return await self.put(key, value, ex=ex, soft_ttl=soft_ttl)
+
+    async def put(self, key: str, value: Any, ex: Optional[int] = None,
+                  soft_ttl: Optional[float] = None) -> Optional[bytes]:
+        """按get_or_fill的格式写入条目, 用于预热等提前写入的场景, 返回编码后的条目"""
+        if value is None:
+            # 负缓存条目没有值, 只有时间戳
+            negative_ttl = setting.cache_negative_ttl
+            if negative_ttl <= 0:
+                return None
+            entry = pack_entry(b'', time.time() + negative_ttl)
+            await self.set(key, entry, ex=negative_ttl)
+            return entry
+        soft_ttl = setting.cache_soft_ttl if soft_ttl is None else soft_ttl
+        entry = pack_entry(codec.encode(value), time.time() + soft_ttl)
+        cache_payload_bytes.observe(len(entry), namespace=_namespace(key))
+        await self.set(key, entry, ex=ex)
+        return entry
+
+    def _refresh(self, key: str, refresh: Callable[[], Awaitable[Any]], ex: Optional[int],
+                 soft_ttl: float) -> None:
+        # 刷新和加载用不同的key, 加载的协程不会等到刷新任务的None, 正在加载时不需要刷新
+        refresh_key = ('refresh', key)
+        if key in single_flight or refresh_key in single_flight:
+            return
+        task = asyncio.get_running_loop().create_task(
+            single_flight.do(refresh_key, lambda: self._refresh_entry(key, refresh, ex, soft_ttl)))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _refresh_entry(self, key: str, refresh: Callable[[], Awaitable[Any]], ex: Optional[int],
+                             soft_ttl: float) -> None:
+        """后台刷新, 多进程间加锁时没拿到锁说明其他进程在刷新, 直接跳过"""
+        counter = self._fill_counter(key)
+        lock_ms = setting.cache_fill_lock_ms
+        lock_key, token = f'{FILL_LOCK_PREFIX}:{key}', uuid.uuid4().hex
+        locked = self.distributed and lock_ms > 0
+        if locked and not await self.set(lock_key, token, px=lock_ms, nx=True):
+            return
+        try:
+            await self._load(key, refresh, ex, soft_ttl)
+            counter['refreshes'] += 1
+        except Exception:
+            counter['refresh_errors'] += 1
+            logger.exception(f'cache refresh failed: {key}')
+        finally:
+            if locked:
+                await self.release_lock(lock_key, token)
+
+    def thrashing_keys(self, n: int = 10) -> List[Tuple[str, int]]:
+        """加载次数最多的key"""
+        return self._key_fills.most_common(n)
+
+    def record_request(self, key: str, result: str) -> None:
+        """不经过get_or_fill读取的缓存也计入cache_requests_total"""
+        self._fill_counter(key)[result] += 1
+
+    def fill_stats(self) -> List[dict]:
+        return [dict(namespace=namespace, hits=counter['hits'], negative_hits=counter['negative_hits'],
+                     stale=counter['stale'], misses=counter['misses'],
+                     refreshes=counter['refreshes'], refresh_ahead=counter['refresh_ahead'],
+                     refresh_errors=counter['refresh_errors'])
+                for namespace, counter in self._fill_counters.items()]
+
+    async def release_lock(self, key: str, token: str) -> None:
+        if await self.get(key) == token.encode():
+            await self.delete(key)
+
+    async def set(self, key: str, value: Union[bytes, str], ex: Optional[int] = None, nx: bool = False,
+                  px: Optional[int] = None) -> bool:
+        """ex为过期秒数, px为过期毫秒数, nx为True时只在key不存在时写入, 返回是否写入"""
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def namespace_keys(self, namespace: str) -> List[str]:
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: str) -> None:
+        pass
+
+    async def close(self) -> None:
+        """等待进行中的后台刷新和失效, 在关闭数据库连接前调用"""
+        if self._pending_invalidations:
+            await asyncio.gather(*list(self._pending_invalidations), return_exceptions=True)
+        if self._refresh_tasks:
+            await asyncio.gather(*list(self._refresh_tasks), return_exceptions=True)
+
+
+class RedisCache(CacheBackend):
+    distributed = True
+
+    # 清理namespace时每批删除的key数量
+    PURGE_BATCH_SIZE = 500
+    RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return await self.client.mget(keys) if keys else []
+
+    async def set(self, key: str, value: Union[bytes, str], ex: Optional[int] = None, nx: bool = False,
+                  px: Optional[int] = None) -> bool:
+        return bool(await self.client.set(key, value, ex=ex, px=px, nx=nx))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*keys)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+    async def namespace_keys(self, namespace: str) -> List[str]:
+        return [key.decode() async for key in self.client.scan_iter(match=f'{namespace}:*',
+                                                                     count=self.PURGE_BATCH_SIZE)]
+
+    async def purge_namespace(self, namespace: str) -> None:
+        """SCAN代替KEYS避免阻塞Redis, 每批key用pipeline发送UNLINK, 在后台线程释放内存"""
+        cache_invalidations.inc(namespace=namespace, kind='purge')
+        await self.invalidate_namespace(namespace)
+        batch = []
+        async for key in self.client.scan_iter(match=f'{namespace}:*', count=self.PURGE_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= self.PURGE_BATCH_SIZE:
+                await self._unlink(batch)
+                batch = []
+        if batch:
+            await self._unlink(batch)
+
+    async def _unlink(self, keys: List[str]) -> None:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.unlink(key)
+            await pipe.execute()
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """只删除自己持有的锁, 比较和删除在Redis中原子执行"""
+        await self.client.eval(self.RELEASE_LOCK_SCRIPT, 1, key, token)
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self.client.publish(channel, message)
+
+    async def close(self) -> None:
+        await super().close()
+        await self.client.close()
+
+
+class LocalCache(CacheBackend):
+    """进程内缓存后端, 单机部署和测试时不需要Redis"""
+
+    def __init__(self, maxsize: int, default_ttl: float):
+        super().__init__()
+        self._cache = LRUCache('local', maxsize=maxsize, ttl=default_ttl)
+        # 代数单独保存, 不会被LRU淘汰, 只有单进程也不需要缓存代数
+        self._namespace_generations: Dict[str, int] = {}
+
+    async def generation(self, namespace: str) -> int:
+        return self._namespace_generations.get(namespace, 0)
+
+    async def invalidate_namespace(self, namespace: str) -> int:
+        self.invalidate_namespace_later(namespace)
+        return self._namespace_generations[namespace]
+
+    def invalidate_namespace_later(self, namespace: str) -> None:
+        # 代数在进程内, 直接递增, 提交返回前就已生效
+        cache_invalidations.inc(namespace=namespace, kind='generation')
+        self._namespace_generations[namespace] = self._namespace_generations.get(namespace, 0) + 1
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return [self._cache.get(key) for key in keys]
+
+    async def set(self, key: str, value: Union[bytes, str], ex: Optional[int] = None, nx: bool = False,
+                  px: Optional[int] = None) -> bool:
+        if nx and key in self._cache:
+            return False
+        # 和Redis一样以bytes保存
+        self._cache.set(key, value.encode() if isinstance(value, str) else value,
+                        ttl=px / 1000 if px is not None else ex)
+        return True
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._cache.delete(key)
+
+    async def incr(self, key: str) -> int:
+        value = int(self._cache.get(key) or 0) + 1
+        self._cache.set(key, str(value).encode())
+        return value
+
+    async def namespace_keys(self, namespace: str) -> List[str]:
+        prefix = f'{namespace}:'
+        return [key for key in self._cache.keys() if key.startswith(prefix)]
+
+
+def create_cache_backend() -> CacheBackend:
+    """cache_backend未配置时, 配置了Redis用Redis, 否则用进程内缓存"""
+    backend = setting.cache_backend or ('redis' if redis is not None else 'local')
+    if backend == 'redis':
+        if redis is None:
+            raise ValueError('cache_backend is redis but redis_url is not set')
+        return RedisCache(redis)
+    if backend == 'local':
+        local = LocalCache(setting.cache_local_size, setting.cache_local_ttl)
+        register_local_cache(local._cache)
+        return local
+    raise ValueError(f'unknown cache_backend: {backend}')
+
+
+cache = create_cache_backend()
+
+
+def invalidate_local(namespace: str, keys: Optional[List[Hashable]] = None) -> None:
+    """清理本进程的本地缓存, keys为空时清理整个namespace"""
+    cache_invalidations.inc(namespace=namespace, kind='local')
+    cache = local_caches.get(namespace)
+    if cache is None:
+        return
+    if keys is None:
+        cache.clear()
+    else:
+        for key in keys:
+            cache.delete(key)
+
+
+async def invalidate(namespace: str, keys: Optional[List[Hashable]] = None) -> None:
+    """清理本地缓存并通过Redis发布失效通知, 其他进程收到后清理各自的本地缓存"""
+    invalidate_local(namespace, keys)
+    if cache.distributed:
+        await cache.publish(INVALIDATE_CHANNEL, json.dumps(dict(namespace=namespace, keys=keys)))
+
+
+def invalidate_on_commit(session: AsyncSession, namespace: str) -> None:
+    """会话提交后再使namespace失效, 避免提交前其他请求读到旧数据写入新代数的缓存; 回滚时不失效"""
+    session.info.setdefault('cache_namespaces', set()).add(namespace)
+
+
+@event.listens_for(SyncSession, 'after_commit')
+def _invalidate_committed_namespaces(session):
+    for namespace in session.info.pop('cache_namespaces', ()):
+        cache.invalidate_namespace_later(namespace)
+
+
+@event.listens_for(SyncSession, 'after_rollback')
+def _clear_namespaces(session):
+    session.info.pop('cache_namespaces', None)
+
+
+async def _listen_invalidation() -> None:
+    while True:
+        try:
+            async with cache.client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    data = json.loads(message['data'])
+                    invalidate_local(data['namespace'], data['keys'])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # 断线期间可能漏掉通知, 清空本地缓存后重连
+            logger.exception('cache invalidation listener error, reconnecting')
+            for local_cache in local_caches.values():
+                local_cache.clear()
+            await asyncio.sleep(1)
+
+
+def start_invalidation_listener() -> Optional[asyncio.Task]:
+    """启动失效通知订阅任务, 进程内缓存后端只有单进程, 不需要订阅"""
+    if not cache.distributed:
+        return None
+    return asyncio.get_running_loop().create_task(_listen_invalidation())
+
+
+@register_collector
+def _collect_cache_metrics():
+    local_stats = get_local_cache_stats()
+    yield 'local_cache_entries', 'gauge', 'Entries in in-process caches', [
+        (dict(namespace=item['namespace']), item['size']) for item in local_stats]
+    for name in ('hits', 'misses', 'evictions', 'expirations'):
+        yield f'local_cache_{name}_total', 'counter', f'In-process cache {name}', [
+            (dict(namespace=item['namespace']), item[name]) for item in local_stats]
+    samples = []
+    for item in cache.fill_stats():
+        samples.extend((dict(namespace=item['namespace'], result=result), item[result])
+                       for result in ('hits', 'negative_hits', 'stale', 'misses'))
+    yield 'cache_requests_total', 'counter', 'Shared cache lookups by namespace and result', samples
+    samples = []
+    for item in cache.fill_stats():
+        samples.extend((dict(namespace=item['namespace'], result=result), item[result])
+                       for result in ('refreshes', 'refresh_ahead', 'refresh_errors'))
+    yield 'cache_refreshes_total', 'counter', 'Background cache refreshes by namespace and result', samples
+    stats = single_flight.stats()
+    yield 'cache_single_flight_total', 'counter', 'Single-flight loads and callers sharing a load', [
+        (dict(result='load'), stats['loads']), (dict(result='shared'), stats['shared'])]
@@ -0,0 +1,69 @@
+import zlib
+from typing import Any, Tuple
+
+from pydantic_core import from_json, to_json, to_jsonable_python
+
+from setting import setting
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 编码结果的首字节, 低位为格式, 最高位表示是否压缩
+FORMAT_JSON = 0x01
+FORMAT_MSGPACK = 0x02
+COMPRESSED = 0x80
+_FORMATS = dict(json=FORMAT_JSON, msgpack=FORMAT_MSGPACK)
+
+
+class Codec:
+    """
+    缓存值编解码. JSON用pydantic_core序列化, 可以直接编码pydantic对象; msgpack需要安装msgpack.
+    编码后超过compress_threshold字节时用zlib压缩, 0为不压缩.
+    解码按首字节判断格式, 切换配置后旧格式的缓存仍能读取
+    """
+
+    def __init__(self, format: str = 'json', compress_threshold: int = 1024, compress_level: int = 1):
+        if format not in _FORMATS:
+            raise ValueError(f'unknown cache codec: {format}')
+        if format == 'msgpack' and msgpack is None:
+            raise ValueError('cache codec is msgpack but msgpack is not installed')
+        self.format = _FORMATS[format]
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    def encode(self, value: Any) -> bytes:
+        if self.format == FORMAT_MSGPACK:
+            return self._frame(FORMAT_MSGPACK, msgpack.packb(to_jsonable_python(value, by_alias=True)))
+        return self._frame(FORMAT_JSON, to_json(value, by_alias=True))
+
+    def _frame(self, format: int, payload: bytes) -> bytes:
+        if 0 < self.compress_threshold <= len(payload):
+            payload = zlib.compress(payload, self.compress_level)
+            format |= COMPRESSED
+        return bytes((format,)) + payload
+
+    @staticmethod
+    def _unframe(data: bytes) -> Tuple[int, bytes]:
+        format, payload = data[0], data[1:]
+        if format & COMPRESSED:
+            payload = zlib.decompress(payload)
+        return format & ~COMPRESSED, payload
+
+    def decode(self, data: bytes) -> Any:
+        format, payload = self._unframe(data)
+        if format == FORMAT_MSGPACK:
+            return msgpack.unpackb(payload)
+        # 缓存的值大多是不重复的字符串, 字符串缓存反而更慢
+        return from_json(payload, cache_strings='keys')
+
+    def decode_json(self, data: bytes) -> bytes:
+        """返回JSON原文, 可以直接写入响应或交给pydantic的validate_json, 不需要先解析成Python对象"""
+        format, payload = self._unframe(data)
+        if format == FORMAT_MSGPACK:
+            return to_json(msgpack.unpackb(payload))
+        return payload
+
+
+codec = Codec(setting.cache_codec, setting.cache_compress_threshold)
@@ -1,8 +1,18 @@
-from functools import wraps
-from typing import Tuple, Sequence, Any
+import asyncio
+import base64
+import binascii
+import json
+import random
+import sqlite3
+import time
+from functools import wraps, lru_cache
+from itertools import chain
+from typing import Tuple, Sequence, Any, List, Optional, Dict, Callable, Awaitable
 from datetime import datetime
 
-from sqlalchemy import MetaData, select, func, String, and_, VARCHAR
+from loguru import logger
+from sqlalchemy import MetaData, Table, Select, select, func, event, text, inspect, String, and_, or_, VARCHAR
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.engine.row import Row
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.ext.asyncio import AsyncEngine
@@ -10,29 +20,237 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import Session as SyncSession
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+from sqlalchemy.sql.util import find_tables
+from starlette.requests import Request
 
 from setting import setting
+from core import profiler
+from core.exception import ApiException
+from core.schema import ResponseCode, PageParams, list_adapter
 
 engine: AsyncEngine
 is_memory_engine = setting.database_uri == 'sqlite+aiosqlite://'
 is_sqlite_engine = 'sqlite' in setting.database_uri
-engine_config = {
-    'echo': setting.database_print_sql
-}
-# memory engine (for test)
-if is_sqlite_engine:
-    engine_config['connect_args'] = {
-        'check_same_thread': False
+
+
+class PoolStats:
+    """连接池统计, 由连接池事件更新"""
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidates = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float):
+        self.wait_count += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+
+class MetricsQueuePool(AsyncAdaptedQueuePool):
+    """记录获取连接耗时(等待空闲连接或新建连接)的连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 登记engine时替换为pool_stats中的统计
+        self.stats = PoolStats()
+
+    def recreate(self):
+        # dispose时重建连接池, 沿用原来的统计
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.record_wait(time.perf_counter() - start)
+
+
+# engine name -> (engine, stats)
+pool_stats: Dict[str, Tuple[AsyncEngine, PoolStats]] = {}
+
+
+def _install_pool_events(name: str, async_engine: AsyncEngine) -> None:
+    stats = PoolStats()
+    pool = async_engine.sync_engine.pool
+    if isinstance(pool, MetricsQueuePool):
+        pool.stats = stats
+
+    def on_connect(*_):
+        stats.connects += 1
+
+    def on_checkout(*_):
+        stats.checkouts += 1
+
+    def on_checkin(*_):
+        stats.checkins += 1
+
+    def on_invalidate(*_):
+        stats.invalidates += 1
+
+    event.listen(pool, 'connect', on_connect)
+    event.listen(pool, 'checkout', on_checkout)
+    event.listen(pool, 'checkin', on_checkin)
+    event.listen(pool, 'invalidate', on_invalidate)
+    pool_stats[name] = (async_engine, stats)
+
+
+def create_engine(uri: str, name: Optional[str] = None) -> AsyncEngine:
+    """name不为空时登记到pool_stats, 由连接池监控、预热和关闭使用; 临时创建的engine不登记"""
+    if name in pool_stats:
+        raise ValueError(f'engine {name} already registered')
+    engine_config = {
+        'echo': setting.database_print_sql
     }
-    engine_config['poolclass'] = StaticPool
-else:
-    engine_config['pool_recycle'] = 1800
+    # memory engine (for test)
+    if 'sqlite' in uri:
+        engine_config['connect_args'] = {
+            'check_same_thread': False
+        }
+        engine_config['poolclass'] = StaticPool
+    else:
+        engine_config['poolclass'] = MetricsQueuePool
+        engine_config['pool_size'] = setting.database_pool_size
+        engine_config['max_overflow'] = setting.database_max_overflow
+        engine_config['pool_timeout'] = setting.database_pool_timeout
+        engine_config['pool_recycle'] = setting.database_pool_recycle
+        engine_config['pool_pre_ping'] = setting.database_pool_pre_ping
+    async_engine = create_async_engine(uri, **engine_config)
+    if name is not None:
+        _install_pool_events(name, async_engine)
+    profiler.install(async_engine.sync_engine)
+    return async_engine
+
+
+async def warmup_engines() -> None:
+    """预先建立连接放入连接池, 避免启动后的第一批请求等待建连"""
+    async def open_connection(async_engine: AsyncEngine):
+        conn = await async_engine.connect()
+        try:
+            await conn.execute(text('SELECT 1'))
+        except Exception:
+            await conn.close()
+            raise
+        return conn
+
+    for async_engine, _ in pool_stats.values():
+        count = setting.database_pool_warmup
+        if isinstance(async_engine.sync_engine.pool, QueuePool):
+            count = min(count, async_engine.sync_engine.pool.size())
+        else:
+            count = min(count, 1)
+        if count <= 0:
+            continue
+        start = time.perf_counter()
+        name = async_engine.url.host or async_engine.url.database
+        results = await asyncio.gather(*[open_connection(async_engine) for _ in range(count)],
+                                       return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        for conn in results:
+            if not isinstance(conn, Exception):
+                await conn.close()
+        # 预热失败不影响启动, 例如某个从库暂时不可用
+        if errors:
+            logger.warning(f'warmup connections for {name} failed: {errors[0]!r}')
+            continue
+        logger.info(f'warmup {count} connections for {name} in {time.perf_counter() - start:.2f}s')
+
+
+async def dispose_engines() -> None:
+    for async_engine, _ in pool_stats.values():
+        await async_engine.dispose()
 
-engine = create_async_engine(setting.database_uri, **engine_config)
-async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+def get_pool_status() -> List[dict]:
+    result = []
+    for name, (async_engine, stats) in pool_stats.items():
+        pool = async_engine.sync_engine.pool
+        status = dict(
+            name=name,
+            pool_class=type(pool).__name__,
+            connects=stats.connects,
+            checkouts=stats.checkouts,
+            checkins=stats.checkins,
+            invalidates=stats.invalidates,
+            timeouts=stats.timeouts,
+            wait_count=stats.wait_count,
+            wait_avg=stats.wait_total / stats.wait_count if stats.wait_count else 0.0,
+            wait_max=stats.wait_max,
+        )
+        if isinstance(pool, QueuePool):
+            status.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                idle=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+            )
+        result.append(status)
+    return result
+
+
+# 写入主库之后的一段时间内, 写入者(同一个登录token或客户端)的读取走主库, 避免读到从库延迟的旧数据.
+# 写入者 -> 截止时间
+_writer_primary_until: Dict[str, float] = {}
+_WRITER_PRIMARY_MAX_SIZE = 10000
+# 不属于请求的会话(缓存加载等)不知道写入者, 任何写入之后的一段时间内都走主库
+_primary_until = 0.0
+
+
+class RoutingSession(SyncSession):
+    """读写分离: 只读查询走从库, flush、写入语句以及transactional内的查询走主库"""
+
+    def __init__(self, primary=None, replicas=(), **kwargs):
+        super().__init__(**kwargs)
+        self.primary = primary
+        self.replicas = list(replicas)
+
+    def _read_your_writes(self) -> bool:
+        writer = self.info.get('writer')
+        until = _primary_until if writer is None else _writer_primary_until.get(writer, 0.0)
+        return time.monotonic() < until
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (not self.replicas
+                or self._flushing
+                or self.info.get('use_primary')
+                or self._read_your_writes()):
+            return self.primary
+        if isinstance(clause, Select) and clause._for_update_arg is None:
+            return random.choice(self.replicas)
+        return self.primary
+
+
+engine = create_engine(setting.database_uri, 'primary')
+replica_engines: List[AsyncEngine] = [create_engine(uri, f'replica{i}')
+                                      for i, uri in enumerate(setting.database_replica_uris)]
+
+
+def make_session_factory(primary: AsyncEngine, replicas: Sequence[AsyncEngine] = ()) -> async_sessionmaker:
+    return async_sessionmaker(
+        sync_session_class=RoutingSession,
+        primary=primary.sync_engine,
+        replicas=[replica.sync_engine for replica in replicas],
+        expire_on_commit=False)
+
+
+async_session = make_session_factory(engine, replica_engines)
 metadata = MetaData()
 
 
@@ -63,19 +281,299 @@ class CoreBaseMixin(TimeBaseMixin, OperatorBaseMixin, LogicDeleteBaseMixin):
     pass
 
 
+def _sort_column(sort_key) -> Tuple[Any, bool]:
+    """拆分排序键, 返回(列, 是否倒序)"""
+    if isinstance(sort_key, UnaryExpression):
+        if sort_key.modifier is operators.desc_op:
+            return sort_key.element, True
+        if sort_key.modifier is operators.asc_op:
+            return sort_key.element, False
+    return sort_key, False
+
+
+def _keyset_condition(columns: List[Tuple[Any, bool]], values: List[Any]):
+    """(a, b) > (x, y) 展开为 a > x OR (a = x AND b > y), 兼容不支持行值比较的数据库"""
+    conditions = []
+    for i, (column, is_desc) in enumerate(columns):
+        equals = [c == v for (c, _), v in zip(columns[:i], values[:i])]
+        compare = column < values[i] if is_desc else column > values[i]
+        conditions.append(and_(*equals, compare))
+    return or_(*conditions)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    data = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, columns: List[Tuple[Any, bool]]) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        result = []
+        for (column, _), value in zip(columns, values):
+            if value is not None and column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            result.append(value)
+        return result
+    except (ValueError, TypeError, binascii.Error):
+        raise ApiException(ResponseCode.BAD_REQUEST, '分页游标无效')
+
+
+# 表版本号, 表有写入时递增, 用于使总数缓存失效
+_table_versions: Dict[str, int] = {}
+# 总数缓存 key -> (过期时间, 表版本快照, 总数)
+_count_cache: Dict[str, Tuple[float, tuple, int]] = {}
+_COUNT_CACHE_MAX_SIZE = 1024
+
+
+def bump_table_versions(tables) -> None:
+    for table in tables:
+        _table_versions[table] = _table_versions.get(table, 0) + 1
+
+
+def clear_count_cache() -> None:
+    _count_cache.clear()
+
+
+def build_count_stmt(stmt):
+    """总数查询, 去掉不影响行数的ORDER BY"""
+    return select(func.count()).select_from(stmt.order_by(None).subquery())
+
+
+def _count_cache_key(count_stmt) -> Tuple[str, List[str]]:
+    compiled = count_stmt.compile(dialect=engine.dialect)
+    params = sorted((k, repr(v)) for k, v in compiled.params.items())
+    tables = sorted({t.name for t in find_tables(count_stmt, include_joins=True) if isinstance(t, Table)})
+    return f'{compiled}|{params}', tables
+
+
+def _get_cached_count(key: str, tables: List[str]) -> Optional[int]:
+    item = _count_cache.get(key)
+    if item is None:
+        return None
+    expire_time, versions, total = item
+    if expire_time < time.monotonic() or versions != tuple(_table_versions.get(t, 0) for t in tables):
+        _count_cache.pop(key, None)
+        return None
+    return total
+
+
+def _count_cache_ttl() -> int:
+    if setting.page_count_cache_ttl is not None:
+        return setting.page_count_cache_ttl
+    backend = setting.cache_backend or ('redis' if setting.redis_url else 'local')
+    return 0 if backend == 'redis' else 10
+
+
+def _set_cached_count(key: str, tables: List[str], total: int) -> None:
+    ttl = _count_cache_ttl()
+    if ttl <= 0:
+        return
+    if len(_count_cache) >= _COUNT_CACHE_MAX_SIZE:
+        _count_cache.pop(next(iter(_count_cache)))
+    versions = tuple(_table_versions.get(t, 0) for t in tables)
+    _count_cache[key] = (time.monotonic() + ttl, versions, total)
+
+
+def _supports_window_count(stmt: Select) -> bool:
+    """能否用COUNT(*) OVER()查询总数. DISTINCT和GROUP BY在窗口函数之后计算, 窗口计数不是结果行数"""
+    if not setting.database_window_count or stmt._distinct or stmt._group_by_clauses:
+        return False
+    dialect = engine.dialect
+    if dialect.name == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 25)
+    if dialect.name == 'mysql':
+        version = dialect.server_version_info or ()
+        return version >= ((10, 2) if dialect.is_mariadb else (8, 0))
+    return True
+
+
+@lru_cache(maxsize=None)
+def _dto_columns(entity, dto_type) -> tuple:
+    fields = dto_type.model_fields
+    return tuple(getattr(entity, attr.key) for attr in inspect(entity).column_attrs if attr.key in fields)
+
+
+def select_dto_columns(stmt: Select, dto_type) -> Select:
+    """实体查询改为只查询DTO需要的列, 结果行不再组装ORM实体"""
+    entity = stmt.column_descriptions[0]['entity']
+    return stmt.with_only_columns(*_dto_columns(entity, dto_type), maintain_column_froms=True)
+
+
+def rows_to_dto_list(keys: Sequence[str], rows: Sequence[Row], dto_type) -> list:
+    """按列名转为dict, 用TypeAdapter整个列表一次校验"""
+    return list_adapter(dto_type).validate_python([dict(zip(keys, row)) for row in rows])
+
+
+async def find_dto_list(stmt: Select, dto_type, session: AsyncSession) -> list:
+    """只读列表查询, 跳过ORM实体和逐行model_validate"""
+    result = await session.execute(select_dto_columns(stmt, dto_type))
+    return rows_to_dto_list(list(result.keys()), result.all(), dto_type)
+
+
 async def get_list_and_total(stmt, page_number: int, page_size: int,
-                             session: AsyncSession) -> Tuple[Sequence[Row], int]:
+                             session: AsyncSession, sort_keys: Optional[list] = None,
+                             after: Optional[str] = None, known_total: Optional[int] = None,
+                             skip_count: bool = False, dto_type=None) -> Tuple[Sequence[Any], Optional[int]]:
+    """
+    分页查询
+    :param sort_keys: 唯一且有索引的排序键, 如[SysUser.user_id]或[SysUser.create_time, SysUser.user_id],
+                      指定后按排序键稳定排序
+    :param after: 游标, 指定sort_keys时用 WHERE 排序键 > 游标 代替 OFFSET
+    :param known_total: 客户端已知的总数, 不为空时不再查询总数
+    :param skip_count: 不查询总数, 返回的总数为None
+    :param dto_type: 指定后只查询DTO需要的列, 直接返回DTO列表
+    """
+    if dto_type is not None:
+        stmt = select_dto_columns(stmt, dto_type)
     offset = (page_number - 1) * page_size
-    count_stmt = select(func.count()).select_from(stmt)
-    count = await session.scalar(count_stmt)
-    select_stmt = stmt.offset(offset).limit(page_size)
-    records = (await session.scalars(select_stmt)).fetchall()
-    return records, count
+    total = known_total
+    count_stmt = cache_key = tables = None
+    if total is None and not skip_count:
+        count_stmt = build_count_stmt(stmt)
+        cache_key, tables = _count_cache_key(count_stmt)
+        total = _get_cached_count(cache_key, tables)
+    need_count = total is None and not skip_count
+
+    if sort_keys:
+        stmt = stmt.order_by(None).order_by(*sort_keys)
+    if sort_keys and after:
+        columns = [_sort_column(key) for key in sort_keys]
+        stmt = stmt.where(_keyset_condition(columns, decode_cursor(after, columns)))
+        select_stmt = stmt.limit(page_size)
+    else:
+        select_stmt = stmt.offset(offset).limit(page_size)
+
+    if need_count and not after and _supports_window_count(select_stmt):
+        # 列表和总数一次查询返回
+        result = await session.execute(select_stmt.add_columns(func.count().over().label('_total')))
+        rows = result.all()
+        if dto_type is None:
+            records = [row[0] for row in rows]
+        else:
+            records = rows_to_dto_list(list(result.keys()), rows, dto_type)
+        if rows:
+            total = rows[0][-1]
+        elif offset == 0:
+            total = 0
+    elif dto_type is None:
+        records = (await session.scalars(select_stmt)).fetchall()
+    else:
+        records = await find_dto_list(select_stmt, dto_type, session)
+
+    if need_count:
+        if total is None:
+            total = await session.scalar(count_stmt)
+        _set_cached_count(cache_key, tables, total)
+    return records, total
+
+
+async def paginate(stmt, page: PageParams, session: AsyncSession,
+                   sort_keys: Optional[list] = None, dto_type=None) -> Tuple[Sequence[Any], Optional[int]]:
+    """按分页参数查询, 指定sort_keys时支持游标分页, 下一页游标写回page.next_cursor"""
+    records, total = await get_list_and_total(stmt, page.page_num, page.page_size, session,
+                                              sort_keys=sort_keys, after=page.after,
+                                              known_total=page.known_total, skip_count=page.skip_count,
+                                              dto_type=dto_type)
+    if sort_keys and records and len(records) == page.page_size:
+        last = records[-1]
+        page.next_cursor = encode_cursor([getattr(last, _sort_column(key)[0].key) for key in sort_keys])
+    return records, total
+
+
+@event.listens_for(SyncSession, 'after_flush')
+def _record_flushed_tables(session, _):
+    tables = {obj.__table__.name for obj in chain(session.new, session.dirty, session.deleted)}
+    if tables:
+        session.info['use_primary'] = True
+    session.info.setdefault('written_tables', set()).update(tables)
+    bump_table_versions(tables)
+
+
+@event.listens_for(SyncSession, 'do_orm_execute')
+def _record_dml_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = orm_execute_state.statement.table
+        orm_execute_state.session.info['use_primary'] = True
+        orm_execute_state.session.info.setdefault('written_tables', set()).add(table.name)
+        bump_table_versions([table.name])
+
+
+@event.listens_for(SyncSession, 'after_commit')
+def _bump_committed_tables(session):
+    global _primary_until
+    tables = session.info.pop('written_tables', ())
+    # 后台批量写入(操作日志等)没有读者等待, 不影响读取路由
+    if tables and session.info.get('read_your_writes', True):
+        until = time.monotonic() + setting.database_replica_read_your_writes
+        _primary_until = until
+        writer = session.info.get('writer')
+        if writer is not None:
+            if len(_writer_primary_until) >= _WRITER_PRIMARY_MAX_SIZE:
+                now = time.monotonic()
+                for key in [key for key, value in _writer_primary_until.items() if value < now]:
+                    del _writer_primary_until[key]
+            _writer_primary_until[writer] = until
+    # 提交时再递增一次, 避免提交前其他会话读到旧数据并写入缓存
+    bump_table_versions(tables)
+
+
+@event.listens_for(SyncSession, 'after_rollback')
+def _clear_written_tables(session):
+    session.info.pop('written_tables', None)
+
+
+@event.listens_for(Table, 'after_create')
+@event.listens_for(Table, 'after_drop')
+def _bump_ddl_table(table, *_, **__):
+    bump_table_versions([table.name])
+
+
+class SessionStats:
+    """请求会话统计, unused为整个请求都没有执行过SQL(没有占用连接)的会话数"""
+
+    def __init__(self):
+        self.total = 0
+        self.unused = 0
+
+
+session_stats = SessionStats()
+
+
+@event.listens_for(SyncSession, 'after_begin')
+def _mark_session_connected(session, transaction, connection):
+    session.info['connected'] = True
+
+
+def _writer_key(request: Request) -> Optional[str]:
+    """写入者: 同一个登录token, 没有登录时同一个客户端IP"""
+    return request.headers.get('authorization') or (request.client.host if request.client else None)
+
+
+async def get_session(request: Request = None) -> AsyncSession:
+    """
+    请求级会话. Session在第一次执行SQL时才从连接池取连接,
+    只命中缓存的请求不会占用连接
+    """
+    async with async_session() as session:
+        if request is not None:
+            session.info['writer'] = _writer_key(request)
+        try:
+            yield session
+        finally:
+            session_stats.total += 1
+            if not session.info.get('connected'):
+                session_stats.unused += 1
 
 
-async def get_session() -> AsyncSession:
+async def run_in_session(func: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+    """新开会话执行func, 用于请求结束后仍在运行的后台任务"""
     async with async_session() as session:
-        yield session
+        return await func(session)
 
 
 def transactional(func):
@@ -85,6 +583,8 @@ def transactional(func):
         if session is None:
             raise ValueError("Session is required")
 
+        # 事务内的读写都走主库
+        session.info['use_primary'] = True
         if session.in_transaction():
             return await func(*args, **kwargs)
         else:
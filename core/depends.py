@@ -1,6 +1,4 @@
-from typing import Optional, Annotated, Union
-import hashlib
-import json
+from typing import Optional, Annotated, Tuple, Union
 import time
 
 from fastapi import Header, Depends, Request
@@ -12,12 +10,11 @@ from core.db import (
     get_session
 )
 
-from core.redis import redis
 from core.exception import ApiException
 from core.jwt import jwt_decode
 from core.schema import ResponseCode
 
-from modules.system import menu_service
+from modules.system import permission_service
 
 
 def get_jwt_token(authorization: Optional[str] = Header(None)) -> Optional[str]:
@@ -33,13 +30,26 @@ def get_jwt_token(authorization: Optional[str] = Header(None)) -> Optional[str]:
     return token
 
 
-def get_current_user_id(token: str = Depends(get_jwt_token)) -> Optional[str]:
-    if token is None:
-        return None
-    # 判断token是否合法
-    payload = jwt_decode(token)
-    user_id = payload['user_id']
-    return user_id
+class AuthContext:
+    """单个请求的认证结果, 保存在request.state.auth, 每个请求只解析一次token"""
+
+    def __init__(self, token: Optional[str] = None, user_id: Optional[int] = None):
+        self.token = token
+        self.user_id = user_id
+
+
+def get_auth_context(request: Request, token: str = Depends(get_jwt_token)) -> AuthContext:
+    auth = getattr(request.state, 'auth', None)
+    # scope中的state可能是多个请求共用的(例如测试客户端), 按token判断是不是本请求的结果
+    if auth is None or auth.token != token:
+        # 判断token是否合法
+        user_id = jwt_decode(token)['user_id'] if token is not None else None
+        auth = request.state.auth = AuthContext(token, user_id)
+    return auth
+
+
+def get_current_user_id(auth: AuthContext = Depends(get_auth_context)) -> Optional[str]:
+    return auth.user_id
 
 
 CurrentUserId = Annotated[Union[str, None], Depends(get_current_user_id)]
@@ -55,35 +65,21 @@ async def is_login(user_id: CurrentUserId):
 login_required = Depends(is_login)
 
 
-async def get_user_permissions(user_id: int, token: str, session: Session) -> set:
-    # 用token的哈希值作为key
-    key = f"user_permission:{hashlib.md5(token.encode()).hexdigest()}"
-    # 从redis中获取用户权限
-    cache_str = await redis.get(key)
-    if cache_str:
-        return json.loads(cache_str)
-
-    permissions = await menu_service.find_menu_permission_set_by_user_id(int(user_id), session)
-
-    await redis.set(key, json.dumps(permissions), expire=60 * 60 * 24)
+async def check_permissions(user_id: Optional[str], control_paths: Tuple[str, ...], require_all: bool = True):
+    if user_id is None:
+        raise ApiException(ResponseCode.LOGIN_REQUIRE)
+    if user_id == 1:
+        return None
 
-    return permissions
+    if not await permission_service.has_permissions(int(user_id), control_paths, require_all):
+        raise ApiException(ResponseCode.PERMISSION_DENY, '没有操作权限')
 
 
-def permission_required(control_path: str) -> Depends:
-    async def permission_required_inner(
-            user_id: CurrentUserId,
-            session: Session,
-            token: str = Depends(get_jwt_token)):
-        """权限校验"""
-        if user_id is None:
-            raise ApiException(ResponseCode.LOGIN_REQUIRE)
-        if user_id == 1:
-            return None
+def permission_required(*control_paths: str, require_all: bool = True) -> Depends:
+    """权限校验, 指定多个权限时require_all为True需要全部拥有, 否则拥有任一即可"""
 
-        permissions = await get_user_permissions(int(user_id), token, session)
-        if control_path not in permissions:
-            raise ApiException(ResponseCode.PERMISSION_DENY, '没有操作权限')
+    async def permission_required_inner(user_id: CurrentUserId):
+        await check_permissions(user_id, control_paths, require_all)
 
     return Depends(permission_required_inner)
 
@@ -92,5 +88,6 @@ __all__ = [
     'Session',
     'CurrentUserId',
     'login_required',
-    'permission_required'
+    'permission_required',
+    'check_permissions'
 ]
@@ -1,10 +1,16 @@
+import time
 from datetime import datetime, timedelta
 import jwt
 
 from setting import setting
+from core.cache import LRUCache, register_local_cache
 from core.exception import ApiException
 from core.schema import ResponseCode
 
+# 已验证的token -> payload, 命中时只检查exp, 不再重复验签
+verified_tokens = register_local_cache(LRUCache('jwt', maxsize=setting.token_cache_size,
+                                                ttl=setting.token_cache_ttl))
+
 
 def jwt_encode(payload: dict, timeout: int):
     # jwt设置过期时间的本质 就是在payload中 设置exp字段, 值要求为格林尼治时间
@@ -16,7 +22,15 @@ def jwt_encode(payload: dict, timeout: int):
 
 
 def jwt_decode(token: str) -> dict:
+    token = str(token)
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        if payload.get('exp', float('inf')) > time.time():
+            return payload
+        verified_tokens.delete(token)
     try:
-        return jwt.decode(str(token), key=setting.token_secret, algorithms='HS256')
+        payload = jwt.decode(token, key=setting.token_secret, algorithms='HS256')
     except jwt.PyJWTError:
-        raise ApiException(ResponseCode.LOGIN_EXPIRE, '凭证已经过期')
\ No newline at end of file
+        raise ApiException(ResponseCode.LOGIN_EXPIRE, '凭证已经过期')
+    verified_tokens.set(token, payload)
+    return payload
\ No newline at end of file
@@ -0,0 +1,113 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# 标签值元组 -> 值
+Samples = Dict[Tuple[str, ...], float]
+
+# 名称 -> 指标
+metrics: Dict[str, 'Metric'] = {}
+# 抓取时才计算的指标, 返回 (名称, 类型, 说明, [(标签, 值)])
+collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[dict, float]]]]]] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        metrics[name] = self
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self.samples: Samples = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self.samples[key] = self.samples.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.samples.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        return [f'{self.name}{_format_labels(dict(zip(self.label_names, key)))} {_format_value(value)}'
+                for key, value in self.samples.items()]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # 标签值元组 -> ([各区间计数], 总和)
+        self.samples: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        sample = self.samples.get(key)
+        if sample is None:
+            sample = self.samples[key] = ([0] * len(self.buckets), [0.0])
+        sample[0][bisect_left(self.buckets, value)] += 1
+        sample[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self.samples.items():
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bucket, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels({**labels, "le": _format_value(bucket)})} '
+                             f'{cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total[0])}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {cumulative}')
+        return lines
+
+
+def register_collector(collector: Callable[[], Iterable[Tuple[str, str, str, List[Tuple[dict, float]]]]]):
+    collectors.append(collector)
+    return collector
+
+
+def render_metrics() -> str:
+    """Prometheus文本格式"""
+    lines = []
+    for metric in metrics.values():
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.render())
+    for collector in collectors:
+        for name, metric_type, documentation, samples in collector():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.extend(f'{name}{_format_labels(labels)} {_format_value(value)}' for labels, value in samples)
+    return '\n'.join(lines) + '\n'
@@ -1,45 +1,147 @@
 import time
+from typing import List, Optional
 
-from fastapi import Request
-from fastapi.responses import JSONResponse
 from loguru import logger
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from setting import setting
+from core.profiler import QueryProfile, current_profile, current_endpoint
+from core.request_log import (RequestLogPipeline, RequestLogRecord, request_log, request_log_handlers,
+                              request_log_records, should_log)
+
+
+def _endpoint(scope: Scope) -> str:
+    return f'{scope["method"]} {scope["path"]}'
+
+
+class BodyPrefix:
+    """只保留前limit字节的请求/响应体, 不缓存整个body"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.size = 0
+        self._chunks: List[bytes] = []
+
+    def feed(self, data: bytes) -> None:
+        if self.size < self.limit and data:
+            self._chunks.append(data[:self.limit - self.size])
+        self.size += len(data)
+
+    @property
+    def truncated(self) -> bool:
+        return self.size > self.limit
+
+    def text(self) -> Optional[str]:
+        if not self.size:
+            return None
+        text = b''.join(self._chunks).decode('utf-8', 'replace')
+        return f'{text}...({self.size} bytes)' if self.truncated else text
 
 
 class SlowRequestMiddleware(object):
-    def __init__(self, limit=1):
+    """请求耗时超过limit秒时记录警告. 纯ASGI中间件, 不经过BaseHTTPMiddleware, 不额外创建任务也不缓存响应"""
+
+    def __init__(self, app: ASGIApp, limit=1):
+        self.app = app
         self.limit = limit
 
-    async def __call__(self, request: Request, call_next):
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        if process_time > self.limit:
-            logger.warning(f'{request.url.path}[{request.method}]---{process_time}')
-        return response
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        start_time = time.perf_counter()
+        token = current_endpoint.set(_endpoint(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_endpoint.reset(token)
+            process_time = time.perf_counter() - start_time
+            if process_time > self.limit:
+                logger.warning(f'{scope["path"]}[{scope["method"]}]---{process_time}')
+
+
+class QueryProfileMiddleware(object):
+    """统计每个请求的SQL数量、耗时和最慢的语句, 调试模式下写入响应头"""
+
+    def __init__(self, app: ASGIApp, n_plus_one_threshold=5):
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        profile = QueryProfile(_endpoint(scope))
+
+        async def send_with_profile(message: Message):
+            # 响应头发送时接口已经执行完, 流式响应只包含到这时为止的SQL
+            if message['type'] == 'http.response.start' and setting.debug:
+                headers = MutableHeaders(scope=message)
+                headers['X-DB-Query-Count'] = str(profile.count)
+                headers['X-DB-Query-Time'] = f'{profile.total_time * 1000:.1f}'
+            await send(message)
 
+        token = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            current_profile.reset(token)
+        profile.log(self.n_plus_one_threshold)
 
-# 记录日志的依赖函数
-async def log_request(request: Request, call_next):
-    start_time = time.time()
 
-    # 记录请求参数
-    request_body = await request.body() if request.method in ["POST", "PUT"] else None
-    request_params = str(request.query_params) if request.query_params else None
+class RequestLogMiddleware(object):
+    """
+    记录请求参数、请求体、响应体和耗时. 通过包装receive/send旁路读取body,
+    只保留前body_limit字节, 不提前读取请求体也不缓存整个响应.
+    日志按采样率放入队列由后台任务写入, 出错和慢请求总是记录
+    """
 
-    response = await call_next(request)
+    def __init__(self, app: ASGIApp, body_limit: int = 2048, pipeline: RequestLogPipeline = request_log):
+        self.app = app
+        self.body_limit = body_limit
+        self.pipeline = pipeline
 
-    # 计算请求耗时
-    process_time = time.time() - start_time
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        start_time = time.perf_counter()
+        request_body = BodyPrefix(self.body_limit)
+        response_body = BodyPrefix(self.body_limit)
+        status_code = None
 
-    # 记录响应JSON
-    response_body = None
-    if isinstance(response, JSONResponse):
-        response_body = response.body.decode('utf-8')
+        async def receive_with_log() -> Message:
+            message = await receive()
+            if message['type'] == 'http.request':
+                request_body.feed(message.get('body', b''))
+            return message
 
-    # 记录日志
-    # TODO 落盘到SysOperLog表
-    logger.info(f"Request: {request.method} {request.url.path} Params: {request_params} Body: {request_body}")
-    logger.info(f"Response: {response.status_code} Body: {response_body}")
-    logger.info(f"Processing time: {process_time:.2f} seconds")
+        async def send_with_log(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            elif message['type'] == 'http.response.body':
+                response_body.feed(message.get('body', b''))
+            await send(message)
 
-    return response
+        error = True
+        try:
+            await self.app(scope, receive_with_log, send_with_log)
+            error = False
+        finally:
+            # 计算请求耗时
+            process_time = time.perf_counter() - start_time
+            logged = should_log(scope['path'], status_code, process_time, error)
+            if logged or request_log_handlers:
+                query_string = scope.get('query_string')
+                record = RequestLogRecord(
+                    scope['method'], scope['path'], query_string.decode('latin-1') if query_string else None,
+                    status_code, process_time, request_body.text(), response_body.text(), error)
+                # 操作日志等处理不受采样影响
+                for handler in request_log_handlers:
+                    try:
+                        handler(scope, record)
+                    except Exception:
+                        logger.exception(f'request log handler {handler.__name__} failed')
+            if logged:
+                self.pipeline.submit(record)
+            else:
+                request_log_records.inc(result='sampled_out')
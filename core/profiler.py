@@ -0,0 +1,144 @@
+import asyncio
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional, List, Tuple, Any
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from setting import setting
+
+
+class QueryProfile:
+    """单个请求的SQL统计"""
+
+    def __init__(self, endpoint: str, slowest_size: int = 3):
+        self.endpoint = endpoint
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_size = slowest_size
+        # (耗时, SQL)
+        self.slowest: List[Tuple[float, str]] = []
+        # SQL -> 执行次数, 参数不同但语句相同的算同一种
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        self.statements[statement] += 1
+        self.slowest.append((duration, statement))
+        self.slowest.sort(key=lambda item: item[0], reverse=True)
+        del self.slowest[self.slowest_size:]
+
+    def n_plus_one(self, threshold: int) -> List[Tuple[str, int]]:
+        """同一语句重复执行threshold次以上, 可能是循环里逐条查询"""
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+    def log(self, n_plus_one_threshold: int) -> None:
+        logger.info(f'SQL profile {self.endpoint}: {self.count} queries, {self.total_time * 1000:.1f}ms')
+        for duration, statement in self.slowest:
+            logger.info(f'SQL profile {self.endpoint} slow: {duration * 1000:.1f}ms {statement}')
+        for statement, count in self.n_plus_one(n_plus_one_threshold):
+            logger.warning(f'SQL profile {self.endpoint} N+1 candidate: executed {count} times {statement}')
+
+
+current_profile: ContextVar[Optional[QueryProfile]] = ContextVar('current_profile', default=None)
+# 当前请求的接口, 用于慢SQL日志
+current_endpoint: ContextVar[Optional[str]] = ContextVar('current_endpoint', default=None)
+
+slow_query_logger = logger.bind(slow_query=True)
+# 已经获取过执行计划的语句, 同一语句只获取一次
+_explained_statements = set()
+_EXPLAIN_CACHE_SIZE = 1000
+# EXPLAIN使用请求的连接池, 同时最多占用一个连接, 正在执行时跳过新的慢SQL
+_EXPLAIN_CONCURRENCY = 1
+_explain_running = 0
+
+
+def setup_slow_query_log() -> None:
+    """慢SQL单独写入按大小滚动的日志文件"""
+    if setting.slow_query_log_file:
+        logger.add(setting.slow_query_log_file, rotation='20 MB', retention=10, delay=True, enqueue=True,
+                   filter=lambda record: record['extra'].get('slow_query', False))
+
+
+def _param_shape(parameters, executemany: bool) -> Any:
+    """只记录参数类型, 不记录参数值"""
+    if executemany and parameters:
+        return f'{len(parameters)} x {_param_shape(parameters[0], False)}'
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+def _explain_prefix(dialect_name: str) -> Optional[str]:
+    if dialect_name == 'sqlite':
+        return 'EXPLAIN QUERY PLAN'
+    if dialect_name in ('mysql', 'postgresql'):
+        return 'EXPLAIN'
+    return None
+
+
+async def _explain(sync_engine: Engine, statement: str, parameters, endpoint: Optional[str]) -> None:
+    global _explain_running
+    prefix = _explain_prefix(sync_engine.dialect.name)
+    try:
+        async with AsyncEngine(sync_engine).connect() as conn:
+            rows = (await conn.exec_driver_sql(f'{prefix} {statement}', parameters)).fetchall()
+        plan = '\n'.join(str(tuple(row)) for row in rows)
+        slow_query_logger.warning(f'slow query plan [{endpoint}] {statement}\n{plan}')
+    except Exception:
+        logger.exception('explain slow query failed')
+    finally:
+        _explain_running -= 1
+
+
+def _log_slow_query(conn, statement: str, parameters, executemany: bool, duration: float) -> None:
+    global _explain_running
+    endpoint = current_endpoint.get()
+    slow_query_logger.warning(f'slow query {duration * 1000:.1f}ms [{endpoint}] {statement} '
+                              f'params: {_param_shape(parameters, executemany)}')
+    if (not setting.slow_query_explain
+            or executemany
+            or not statement.lstrip()[:6].upper() == 'SELECT'
+            or _explain_prefix(conn.dialect.name) is None
+            or statement in _explained_statements
+            or _explain_running >= _EXPLAIN_CONCURRENCY):
+        return
+    if len(_explained_statements) >= _EXPLAIN_CACHE_SIZE:
+        _explained_statements.clear()
+    _explained_statements.add(statement)
+    _explain_running += 1
+    # 在事件循环中异步获取执行计划, 不阻塞当前请求
+    asyncio.get_running_loop().create_task(_explain(conn.engine, statement, parameters, endpoint))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_start_time'].pop()
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record(statement, duration)
+    if 0 < setting.slow_query_threshold <= duration:
+        _log_slow_query(conn, statement, parameters, executemany, duration)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start_time'):
+        conn.info['query_start_time'].pop()
+
+
+def install(sync_engine: Engine) -> None:
+    """注册SQL执行事件, 没有进行中的统计时只记录开始时间"""
+    event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(sync_engine, 'handle_error', _handle_error)
@@ -1,5 +1,3 @@
-import asyncio
-
 from redis.asyncio import from_url, Redis
 
 from setting import setting
@@ -7,10 +5,6 @@ from setting import setting
 redis: Redis | None = None
 
 if setting.redis_url is not None:
-    redis = from_url('redis://' + setting.redis_url, encoding="utf-8", decode_responses=True)
-
+    # 缓存值为编码后的bytes, 不解码为字符串
+    redis = from_url('redis://' + setting.redis_url)
 
-async def clear_cache_by_namespace(namespace: str):
-    keys = await redis.keys(f'{namespace}:*')
-    # parallel delete
-    await asyncio.gather(*[redis.delete(key) for key in keys])
@@ -0,0 +1,125 @@
+import asyncio
+import random
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from loguru import logger
+
+from setting import setting
+from core.metrics import Counter, register_collector
+
+request_log_records = Counter('request_log_records_total', 'Request log records by result', ['result'])
+# 每个请求结束后调用, 不受采样影响, 参数为ASGI scope和日志记录, 不能阻塞
+request_log_handlers: List[Callable[[dict, 'RequestLogRecord'], None]] = []
+# 放入队列通知后台任务写完剩余日志后退出
+_STOP = object()
+
+
+class RequestLogRecord(object):
+    __slots__ = ('method', 'path', 'query_string', 'status_code', 'process_time', 'request_body', 'response_body',
+                 'error', 'time')
+
+    def __init__(self, method: str, path: str, query_string: Optional[str], status_code: Optional[int],
+                 process_time: float, request_body: Optional[str], response_body: Optional[str], error: bool = False):
+        self.time = datetime.now()
+        self.method = method
+        self.path = path
+        self.query_string = query_string
+        self.status_code = status_code
+        self.process_time = process_time
+        self.request_body = request_body
+        self.response_body = response_body
+        self.error = error
+
+    def format(self) -> str:
+        return (f'Request: {self.method} {self.path} Params: {self.query_string} Body: {self.request_body} '
+                f'Response: {self.status_code} Body: {self.response_body} '
+                f'Processing time: {self.process_time:.2f} seconds')
+
+
+def register_request_log_handler(handler: Callable[[dict, 'RequestLogRecord'], None]):
+    request_log_handlers.append(handler)
+    return handler
+
+
+def sample_rate(path: str) -> float:
+    """按最长的路径前缀取采样率, 没有配置的接口用request_log_sample_rate"""
+    rate, matched = setting.request_log_sample_rate, -1
+    for prefix, prefix_rate in setting.request_log_sample_rates.items():
+        if len(prefix) > matched and path.startswith(prefix):
+            rate, matched = prefix_rate, len(prefix)
+    return rate
+
+
+def should_log(path: str, status_code: Optional[int], process_time: float, error: bool) -> bool:
+    """出错和慢请求总是记录, 其余按采样率记录"""
+    if error or status_code is None or status_code >= 400 or process_time >= setting.request_log_slow_threshold:
+        return True
+    rate = sample_rate(path)
+    return rate >= 1 or random.random() < rate
+
+
+class RequestLogPipeline(object):
+    """
+    请求日志放入有界队列, 由后台任务批量在线程中写入, 不在请求中也不在事件循环中写日志.
+    队列满时丢弃并计数; 后台任务未启动时直接写入
+    """
+
+    def __init__(self, maxsize: int = 10000, batch_size: int = 100):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.batch_size = batch_size
+        self._writer: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def write(records: List[RequestLogRecord]) -> None:
+        for record in records:
+            logger.info(record.format())
+        request_log_records.inc(len(records), result='written')
+
+    def submit(self, record: RequestLogRecord) -> None:
+        if self._writer is None:
+            self.write([record])
+            return
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            request_log_records.inc(result='dropped')
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            records = [await self.queue.get()]
+            while len(records) < self.batch_size and not self.queue.empty():
+                records.append(self.queue.get_nowait())
+            if records[-1] is _STOP:
+                records.pop()
+                stopping = True
+            if not records:
+                continue
+            try:
+                # logger的sink(控制台、文件)同步写入, 在线程中执行, 不阻塞事件循环
+                await loop.run_in_executor(None, self.write, records)
+            except Exception:
+                logger.exception('write request log failed')
+
+    def start(self) -> None:
+        if self._writer is None:
+            self._writer = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务, 等待写完队列中剩余的日志, 之后提交的日志直接写入"""
+        writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        await self.queue.put(_STOP)
+        await writer
+
+
+request_log = RequestLogPipeline(setting.request_log_queue_size)
+
+
+@register_collector
+def _collect_request_log_metrics():
+    yield 'request_log_queue_size', 'gauge', 'Request log records waiting to be written', [
+        (dict(), request_log.queue.qsize())]
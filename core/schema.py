@@ -1,7 +1,15 @@
+import inspect
+from functools import lru_cache, wraps
 from typing import TypeVar, Generic, Any, List, Optional, Annotated
 from fastapi import Query, Depends
-from pydantic import BaseModel, ConfigDict, create_model, BeforeValidator
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, create_model, BeforeValidator
 from pydantic.alias_generators import to_camel
+from pydantic_core import to_json
+
+from core.tree import build_tree
 
 T = TypeVar('T')
 
@@ -22,9 +30,18 @@ class _PageParams:
     """分页查询参数"""
 
     def __init__(self, page_num: int = Query(1, alias='pageNum'),
-                 page_size: int = Query(10, alias='pageSize')):
+                 page_size: int = Query(10, alias='pageSize'),
+                 after: Optional[str] = Query(None, alias='after'),
+                 known_total: Optional[int] = Query(None, alias='knownTotal'),
+                 skip_count: bool = Query(False, alias='skipCount')):
         self.page_num = page_num
         self.page_size = page_size
+        # 游标分页: 上一页返回的nextCursor, 为空时按pageNum分页
+        self.after = after
+        self.next_cursor: Optional[str] = None
+        # 翻页时客户端回传第一页的总数, 或者不需要总数时跳过count查询
+        self.known_total = known_total
+        self.skip_count = skip_count
 
 
 PageParams = Annotated[_PageParams, Depends()]
@@ -47,11 +64,54 @@ class BaseResponse(CamelModel):
         return cls(data=data)
 
 
+def dump_json(content: Any) -> bytes:
+    """按别名一次序列化为bytes, 不经过jsonable_encoder, 非pydantic对象回退到jsonable_encoder"""
+    return to_json(content, by_alias=True, fallback=jsonable_encoder)
+
+
+class ModelResponse(JSONResponse):
+    """直接渲染BaseResponse/TableDataInfo等pydantic对象的JSON响应"""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+class RawDataResponse(Response):
+    """data为已经序列化的JSON, 直接拼接为BaseResponse的结构写入响应, 不再解析和校验"""
+    media_type = 'application/json'
+
+    def __init__(self, data: bytes, code: int = ResponseCode.SUCCESS, msg: str = '', **kwargs):
+        super().__init__(b'{"code":%d,"msg":%s,"data":%s}' % (code, to_json(msg), data), **kwargs)
+
+
+class ModelRoute(APIRoute):
+    """
+    接口返回pydantic对象或dict时直接包装为ModelResponse,
+    跳过FastAPI默认的jsonable_encoder再json.dumps的两次序列化
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        call = self.dependant.call
+        if inspect.iscoroutinefunction(call):
+            status_code = self.status_code
+
+            @wraps(call)
+            async def wrapper(*args, **kw):
+                content = await call(*args, **kw)
+                if isinstance(content, Response):
+                    return content
+                return ModelResponse(content, status_code=status_code or 200)
+
+            self.dependant.call = wrapper
+
+
 class TableDataInfo(BaseModel, Generic[T]):
-    total: int
+    total: Optional[int]
     rows: List[T]
     code: int = ResponseCode.SUCCESS
     msg: str = ''
+    next_cursor: Optional[str] = Field(None, serialization_alias='nextCursor')
 
 
 class TreeSelect(CamelModel):
@@ -66,15 +126,18 @@ class TreeSelect(CamelModel):
                    id_key='id',
                    label_key='label',
                    parent_key='parent_id',
-                   root_parent_value=0) -> List['TreeSelect']:
+                   root_parent_value=0,
+                   orphan_as_root=False,
+                   max_depth=None) -> List['TreeSelect']:
         tree_data_list = [cls(
             id=getattr(data, id_key),
             label=getattr(data, label_key),
             parent_id=getattr(data, parent_key),
             children=[]) for data in data_list]
-        for tree_data in tree_data_list:
-            tree_data.children = [child for child in tree_data_list if child.parent_id == tree_data.id]
-        return [tree_data for tree_data in tree_data_list if tree_data.parent_id == root_parent_value]
+        return build_tree(tree_data_list,
+                          root_parent_value=root_parent_value,
+                          orphan_as_root=orphan_as_root,
+                          max_depth=max_depth)
 
 
 _exclude_fields = ['create_by', 'create_time', 'update_by', 'update_time', 'del_flag']
@@ -91,6 +154,12 @@ def make_optional_dto(entity, exclude_fields=None) -> type[BaseModel]:
     return create_model(f'Optional{entity.__name__}DTO', **fields, __config__=camel_config)
 
 
+@lru_cache(maxsize=None)
+def list_adapter(dto_type: type[BaseModel]) -> TypeAdapter:
+    """DTO列表的TypeAdapter, 整个列表一次校验, 按类型缓存"""
+    return TypeAdapter(List[dto_type])
+
+
 def make_query_dto(*attributes) -> type[BaseModel]:
     """
     创建查询DTO的快捷函数
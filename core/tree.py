@@ -0,0 +1,50 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+def build_tree(nodes: Iterable[T],
+               id_key: str = 'id',
+               parent_key: str = 'parent_id',
+               children_key: str = 'children',
+               root_parent_value: Any = 0,
+               sort_key: Optional[Callable[[T], Any]] = None,
+               orphan_as_root: bool = False,
+               max_depth: Optional[int] = None) -> List[T]:
+    """
+    按父ID建立索引组装树, 时间复杂度O(n)
+    :param nodes: 节点列表, 节点的children_key属性会被覆盖
+    :param sort_key: 同级节点排序, 默认保持输入顺序
+    :param orphan_as_root: 父节点不在列表中的节点作为根节点, 默认丢弃
+    :param max_depth: 最大层数, 根节点为第1层, 超出的节点丢弃
+    :return: 根节点列表
+    """
+    nodes = list(nodes)
+    id_set = {getattr(node, id_key) for node in nodes}
+    children_map: Dict[Any, List[T]] = defaultdict(list)
+    roots = []
+    for node in nodes:
+        parent_id = getattr(node, parent_key)
+        if parent_id == root_parent_value or (orphan_as_root and parent_id not in id_set):
+            roots.append(node)
+        else:
+            children_map[parent_id].append(node)
+
+    if sort_key is not None:
+        roots.sort(key=sort_key)
+    # 逐层向下挂载, 每个节点只会被访问一次, 环上的节点不可达会被丢弃
+    level, depth = roots, 1
+    while level:
+        next_level = []
+        for node in level:
+            if max_depth is not None and depth >= max_depth:
+                children = []
+            else:
+                children = children_map.get(getattr(node, id_key), [])
+                if sort_key is not None:
+                    children.sort(key=sort_key)
+            setattr(node, children_key, children)
+            next_level.extend(children)
+        level, depth = next_level, depth + 1
+    return roots
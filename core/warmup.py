@@ -0,0 +1,85 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from setting import setting
+from core.db import async_session
+
+# 预热函数查询数据后返回写入缓存的任务列表, 每个任务写入一个key
+Warmer = Callable[[AsyncSession], Awaitable[List[Callable[[], Awaitable[Any]]]]]
+
+# 名称 -> 预热函数
+warmers: Dict[str, Warmer] = {}
+# 最近一次预热的结果
+warmup_report: dict = dict(status='pending')
+
+
+def register_warmer(name: str):
+    """注册缓存预热函数, 在lifespan启动时执行"""
+
+    def decorator(func: Warmer) -> Warmer:
+        warmers[name] = func
+        return func
+
+    return decorator
+
+
+async def _run_warmer(name: str, warmer: Warmer, semaphore: asyncio.Semaphore, result: dict) -> None:
+    start = time.perf_counter()
+    try:
+        async with async_session() as session:
+            async with semaphore:
+                jobs = await warmer(session)
+            result['keys'] = len(jobs)
+
+            async def run_job(job):
+                async with semaphore:
+                    await job()
+                result['warmed'] += 1
+
+            await asyncio.gather(*[run_job(job) for job in jobs])
+        result['status'] = 'done'
+    except Exception as e:
+        result['status'] = 'failed'
+        logger.warning(f'cache warmup {name} failed: {e!r}')
+    finally:
+        result['ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+
+async def run_warmup(budget: Optional[float] = None, concurrency: Optional[int] = None) -> dict:
+    """
+    并发执行所有预热函数, 同时进行的查询和缓存写入不超过concurrency个,
+    超过budget秒未完成的预热取消, 已写入的key保留
+    """
+    budget = setting.cache_warmup_budget if budget is None else budget
+    semaphore = asyncio.Semaphore(setting.cache_warmup_concurrency if concurrency is None else concurrency)
+    results = {name: dict(status='running', keys=0, warmed=0) for name in warmers}
+    warmup_report.clear()
+    warmup_report.update(status='running', warmers=results)
+    start = time.perf_counter()
+    tasks = [asyncio.get_running_loop().create_task(_run_warmer(name, warmer, semaphore, results[name]))
+             for name, warmer in warmers.items()]
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=budget)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    for result in results.values():
+        if result['status'] == 'running':
+            result['status'] = 'timeout'
+    warmup_report.update(status='done', ms=round((time.perf_counter() - start) * 1000, 1))
+    logger.info(f'cache warmup finished in {warmup_report["ms"]}ms: ' +
+                ', '.join(f'{name} {result["status"]} {result["warmed"]}/{result["keys"]} keys {result["ms"]}ms'
+                          for name, result in results.items()))
+    return warmup_report
+
+
+def start_warmup() -> Optional[asyncio.Task]:
+    """启动缓存预热任务, 未开启预热时返回None"""
+    if not setting.cache_warmup:
+        warmup_report.update(status='disabled')
+        return None
+    return asyncio.get_running_loop().create_task(run_warmup())
@@ -0,0 +1,52 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import PlainTextResponse
+
+from setting import setting
+from core.db import get_pool_status, session_stats
+from core.cache import get_cache_stats
+from core.metrics import render_metrics
+from core.warmup import warmup_report
+from core.depends import permission_required, check_permissions, get_jwt_token, get_auth_context
+from core.schema import BaseResponse, ModelRoute
+
+api = APIRouter(prefix='/monitor', route_class=ModelRoute)
+
+
+async def metrics_auth(request: Request, token: Optional[str] = Depends(get_jwt_token)):
+    """配置了metrics_token时用它抓取指标, 不需要登录; 否则需要服务监控权限"""
+    if setting.metrics_token and token is not None and hmac.compare_digest(token, setting.metrics_token):
+        return
+    await check_permissions(get_auth_context(request, token).user_id, ('monitor:server:list',))
+
+
+@api.get('/pool', dependencies=[permission_required('monitor:druid:list')])
+async def get_pool_status_endpoint():
+    """数据库连接池状态"""
+    return BaseResponse(data=get_pool_status())
+
+
+@api.get('/session', dependencies=[permission_required('monitor:druid:list')])
+async def get_session_stats_endpoint():
+    """请求会话统计"""
+    return BaseResponse(data=dict(total=session_stats.total, unused=session_stats.unused))
+
+
+@api.get('/cache', dependencies=[permission_required('monitor:cache:list')])
+async def get_cache_stats_endpoint():
+    """进程内缓存命中、未命中和淘汰统计, 缓存后端各namespace的过期和后台刷新统计"""
+    return BaseResponse(data=get_cache_stats())
+
+
+@api.get('/warmup', dependencies=[permission_required('monitor:cache:list')])
+async def get_warmup_report_endpoint():
+    """启动时缓存预热的结果"""
+    return BaseResponse(data=warmup_report)
+
+
+@api.get('/metrics', response_class=PlainTextResponse, dependencies=[Depends(metrics_auth)])
+async def get_metrics_endpoint():
+    """Prometheus文本格式的缓存指标"""
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,14 +10,15 @@ from captcha.image import ImageCaptcha
 from setting import setting
 from core.depends import Session, CurrentUserId
 from core.jwt import jwt_encode
-from core.redis import redis
-from core.schema import BaseResponse, ResponseCode
+from core.cache import cache
+from core.schema import BaseResponse, ResponseCode, ModelRoute
+from core.tree import build_tree
 from core.exception import ApiException
 from modules.system import user_service
 from modules.system import role_service
 from modules.system import menu_service
 
-api = APIRouter()
+api = APIRouter(route_class=ModelRoute)
 image_captcha = ImageCaptcha()
 captcha_chars = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
@@ -39,10 +40,10 @@ async def login_endpoint(form: LoginForm, session: Session):
     if not setting.ignore_captcha:
         if form.uuid is None or form.code is None:
             raise ApiException(ResponseCode.CAPTCHA_ERROR, '验证码错误')
-        captcha_text = await redis.get(f"captcha:{form.uuid}")
+        captcha_text = await cache.get(f"captcha:{form.uuid}")
         if captcha_text is None:
             raise ApiException(ResponseCode.CAPTCHA_TIMEOUT, '验证码已过期')
-        if captcha_text.lower() != form.code.lower():
+        if captcha_text.decode().lower() != form.code.lower():
             raise ApiException(ResponseCode.CAPTCHA_ERROR, '验证码错误')
     user = await user_service.user_login(form.username, form.password, session=session)
     token = generate_token(user)
@@ -76,9 +77,7 @@ async def get_info(user_id: CurrentUserId, session: Session):
 async def get_routers(user_id: CurrentUserId, session: Session):
     query_dto = menu_service.SysMenuQueryDTO(menu_type_list=['M', 'C'], status='0')
     menu_list = await menu_service.find_menu_list_by_user_id(query_dto, user_id, session)
-    for menu in menu_list:
-        menu.children = [child for child in menu_list if child.parent_id == menu.menu_id]
-    menu_list = [menu for menu in menu_list if menu.parent_id == 0]
+    menu_list = build_tree(menu_list, id_key='menu_id')
     return BaseResponse(data=menu_service.build_menus(menu_list))
 
 
@@ -102,7 +101,7 @@ async def get_captcha():
     # generate uid by uuid
     uid = uuid.uuid4().hex
 
-    # save captcha to redis
-    await redis.set(f"captcha:{uid}", text, ex=60)
+    # save captcha to cache
+    await cache.set(f"captcha:{uid}", text, ex=60)
 
     return GetCaptchaResponse(code=ResponseCode.SUCCESS, uuid=uid, img=img_str)
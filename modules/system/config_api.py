@@ -5,17 +5,17 @@ from core.depends import (
     CurrentUserId,
     login_required
 )
-from core.schema import PageParams, BaseResponse, TableDataInfo
+from core.schema import PageParams, BaseResponse, TableDataInfo, ModelRoute
 from modules.system.config_service import (SysConfigDTO, create, find_page, update, delete_by_ids, find_by_id,
                                            get_config_key, clear_cache)
 
-api = APIRouter(prefix='/system/config', dependencies=[login_required])
+api = APIRouter(prefix='/system/config', dependencies=[login_required], route_class=ModelRoute)
 
 
 @api.get('/list')
 async def find_page_endpoint(session: Session, page: PageParams, params: SysConfigDTO = Depends()):
     rows, total = await find_page(params, page, session)
-    return TableDataInfo(rows=rows, total=total)
+    return TableDataInfo(rows=rows, total=total, next_cursor=page.next_cursor)
 
 
 @api.get('/{id}')
@@ -24,8 +24,8 @@ async def find_by_id_endpoint(id: int, session: Session):
 
 
 @api.get('/configKey/{configKey}')
-async def get_config_key_endpoint(configKey: str, session: Session):
-    return BaseResponse(data=await get_config_key(config_key=configKey, session=session))
+async def get_config_key_endpoint(configKey: str):
+    return BaseResponse(data=await get_config_key(config_key=configKey))
 
 
 @api.post('')
@@ -42,14 +42,15 @@ async def update_endpoint(dto: SysConfigDTO, user_id: CurrentUserId, session: Se
     return BaseResponse(msg='编辑成功')
 
 
+# 需要在 /{ids} 之前注册
+@api.delete('/refreshCache')
+async def refresh_cache_endpoint():
+    await clear_cache()
+    return BaseResponse(msg='刷新成功')
+
+
 @api.delete('/{ids}')
 async def delete_endpoint(ids: str, session: Session):
     await delete_by_ids(ids, session)
     await session.commit()
     return BaseResponse(msg='删除成功')
-
-
-@api.delete('/refreshCache')
-async def refresh_cache_endpoint():
-    await clear_cache()
-    return BaseResponse(msg='刷新成功')
@@ -1,3 +1,4 @@
+from functools import partial
 from typing import List, Tuple, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -5,8 +6,9 @@ from sqlalchemy import select, delete, and_
 
 from core.exception import ApiException
 from core.schema import ResponseCode, PageParams, make_optional_dto
-from core.db import get_list_and_total, assert_key_unique
-from core.redis import redis, clear_cache_by_namespace
+from core.db import paginate, assert_key_unique, run_in_session
+from core.cache import cache, invalidate_on_commit
+from core.warmup import register_warmer
 from .table import SysConfig
 
 CACHE_NAMESPACE = 'sys_config'
@@ -22,8 +24,7 @@ async def find_page(params: SysConfigDTO, page: PageParams,
         stmt = stmt.where(SysConfig.config_key == params.config_key)
     if params.config_type:
         stmt = stmt.where(SysConfig.config_type == params.config_type)
-    records, total = await get_list_and_total(stmt, page.page_num, page.page_size, session)
-    return [SysConfigDTO.model_validate(user, from_attributes=True) for user in records], total
+    return await paginate(stmt, page, session, sort_keys=[SysConfig.config_id], dto_type=SysConfigDTO)
 
 
 async def find_by_id(id, session) -> SysConfigDTO:
@@ -39,6 +40,8 @@ async def create(form: SysConfigDTO, operator_id: int, session: AsyncSession) ->
     e = SysConfig(**form.model_dump(), create_by=operator_id)
     session.add(e)
     await session.flush()
+    # 清除这个key的负缓存
+    invalidate_on_commit(session, CACHE_NAMESPACE)
 
     return e.config_id
 
@@ -52,28 +55,39 @@ async def update(form: SysConfigDTO, operator_id: int, session: AsyncSession) ->
     for key, value in form.model_dump(exclude={'config_id'}).items():
         setattr(e, key, value)
     e.update_by = operator_id
+    invalidate_on_commit(session, CACHE_NAMESPACE)
 
 
 async def delete_by_ids(ids: str, session: AsyncSession) -> None:
     id_list = [int(i) for i in ids.split(",")]
     stmt = delete(SysConfig).where(SysConfig.config_id.in_(id_list))
     await session.execute(stmt)
+    invalidate_on_commit(session, CACHE_NAMESPACE)
 
 
-async def get_config_key(config_key: str, session: AsyncSession) -> Optional[str]:
-    cache_key = f'{CACHE_NAMESPACE}:get_config_key:{config_key}'
-    cache_value = await redis.get(cache_key)
-    if cache_value:
-        return cache_value
+async def _load_config_value(config_key: str, session: AsyncSession) -> Optional[str]:
+    stmt = select(SysConfig.config_value).where(and_(SysConfig.config_key == config_key))
+    return (await session.scalars(stmt)).one_or_none()
 
-    stmt = select(SysConfig).where(and_(SysConfig.config_key == config_key))
-    e = (await session.scalars(stmt)).one_or_none()
-    if e is not None:
-        await redis.set(cache_key, e.config_value)
-        return e.config_value
-    else:
-        return None
+
+async def _config_cache_key(config_key: str) -> str:
+    return await cache.namespace_key(CACHE_NAMESPACE, f'get_config_key:{config_key}')
+
+
+async def get_config_key(config_key: str) -> Optional[str]:
+    cache_key = await _config_cache_key(config_key)
+    # 等待同一个key的请求共用加载结果, 加载时新开会话, 不依赖发起加载的请求的会话
+    loader = partial(run_in_session, partial(_load_config_value, config_key))
+    return await cache.get_or_fill(cache_key, loader, ex=3600, refresh=loader)
 
 
 async def clear_cache():
-    await clear_cache_by_namespace(CACHE_NAMESPACE)
+    await cache.purge_namespace(CACHE_NAMESPACE)
+
+
+@register_warmer('sys_config')
+async def warmup_config_cache(session: AsyncSession) -> list:
+    """一次查出所有参数配置写入缓存"""
+    rows = (await session.execute(select(SysConfig.config_key, SysConfig.config_value))).all()
+    return [partial(cache.put, await _config_cache_key(config_key), config_value, ex=3600)
+            for config_key, config_value in rows]
@@ -6,12 +6,12 @@ from core.depends import (
     login_required
 )
 
-from core.schema import BaseResponse
+from core.schema import BaseResponse, ModelRoute
 
 from modules.system.dept_service import (SysDeptDTO, create_dept, find_all_dept,
                                          update_dept, delete_dept_by_ids, find_dept_by_id)
 
-api = APIRouter(prefix='/system/dept', dependencies=[login_required])
+api = APIRouter(prefix='/system/dept', dependencies=[login_required], route_class=ModelRoute)
 
 
 @api.get('/list')
@@ -1,4 +1,4 @@
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Set, Dict
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import (
@@ -12,7 +12,8 @@ from sqlalchemy import (
 from core.exception import ApiException
 from core.schema import ResponseCode, PageParams, TreeSelect, CamelModel, make_query_dto
 from core.db import (
-    get_list_and_total
+    paginate,
+    find_dto_list
 )
 
 from .table import SysDept, SysUser, SysRoleDept
@@ -47,24 +48,20 @@ def build_stmt(params) -> Select:
 
 async def find_dept_page(params, page: PageParams, session: AsyncSession) -> Tuple[List[SysDeptDTO], int]:
     stmt = build_stmt(params)
-    records, total = await get_list_and_total(stmt, page.page_num, page.page_size, session)
-    return [SysDeptDTO.model_validate(user, from_attributes=True) for user in records], total
+    return await paginate(stmt, page, session, sort_keys=[SysDept.dept_id], dto_type=SysDeptDTO)
 
 
 async def find_all_dept(params, session: AsyncSession) -> List[SysDeptDTO]:
     stmt = build_stmt(params)
     stmt = stmt.order_by(SysDept.parent_id, SysDept.order_num)
-    records = (await session.scalars(stmt)).fetchall()
-    return [SysDeptDTO.model_validate(e, from_attributes=True) for e in records]
+    return await find_dto_list(stmt, SysDeptDTO, session)
 
 
 async def select_dept_tree_list(params, session: AsyncSession) -> List[TreeSelect]:
     stmt = build_stmt(params)
     stmt = stmt.order_by(SysDept.parent_id, SysDept.order_num)
-    records = (await session.scalars(stmt)).fetchall()
-    print(len(records))
     return TreeSelect.build_tree(
-        data_list=[SysDeptDTO.model_validate(e, from_attributes=True) for e in records],
+        data_list=await find_dto_list(stmt, SysDeptDTO, session),
         id_key='dept_id',
         label_key='dept_name')
 
@@ -81,6 +78,13 @@ async def find_dept_by_id(id, session) -> SysDept:
     return e
 
 
+async def find_dept_map_by_ids(id_set: Set[int], session: AsyncSession) -> Dict[int, SysDeptDTO]:
+    if not id_set:
+        return {}
+    stmt = select(SysDept).where(SysDept.dept_id.in_(id_set), SysDept.del_flag == '0')
+    return {e.dept_id: e for e in await find_dto_list(stmt, SysDeptDTO, session)}
+
+
 async def create_dept(form: SysDeptDTO, operator_id: int, session: AsyncSession) -> id:
     await assert_dept_name_unique(form.dept_name, session)
 
@@ -154,5 +158,4 @@ async def get_dept_user_count(dept_id: int, session: AsyncSession) -> int:
 async def find_dept_list_by_role_id(role_id: int, session: AsyncSession) -> List[SysDeptDTO]:
     stmt = select(SysDept).join(SysRoleDept, SysDept.dept_id == SysRoleDept.dept_id).where(
         SysRoleDept.role_id == role_id, SysDept.del_flag == '0')
-    records = (await session.scalars(stmt)).fetchall()
-    return [SysDeptDTO.model_validate(e, from_attributes=True) for e in records]
+    return await find_dto_list(stmt, SysDeptDTO, session)
@@ -5,12 +5,12 @@ from core.depends import (
     CurrentUserId,
     login_required
 )
-from core.schema import BaseResponse, TreeSelect
+from core.schema import BaseResponse, TreeSelect, ModelRoute
 from modules.system.menu_service import (SysMenuDTO, create, find_page, update, delete_by_ids, find_by_id,
                                          find_menu_list_by_user_id, find_menu_list_by_role_id, SysMenuQueryDTO,
                                          find_all_menu)
 
-api = APIRouter(prefix='/system/menu', dependencies=[login_required])
+api = APIRouter(prefix='/system/menu', dependencies=[login_required], route_class=ModelRoute)
 
 
 @api.get('/list')
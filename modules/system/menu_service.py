@@ -12,7 +12,7 @@ from sqlalchemy import (
 
 from core.exception import ApiException
 from core.schema import ResponseCode, PageParams, CamelModel, AutoString, make_query_dto
-from core.db import get_list_and_total, assert_key_unique
+from core.db import paginate, find_dto_list, assert_key_unique
 
 from .table import SysMenu, SysRoleMenu, SysUserRole, SysRole
 
@@ -70,14 +70,12 @@ async def find_page(params: SysMenuDTO, page: PageParams,
         stmt = stmt.where(SysMenu.parent_id == params.parent_id)
     if params.status:
         stmt = stmt.where(SysMenu.status == params.status)
-    records, total = await get_list_and_total(stmt, page.page_num, page.page_size, session)
-    return [SysMenuDTO.model_validate(user, from_attributes=True) for user in records], total
+    return await paginate(stmt, page, session, sort_keys=[SysMenu.menu_id], dto_type=SysMenuDTO)
 
 
 async def find_all_menu(params, session: AsyncSession) -> List[SysMenuDTO]:
     stmt = build_query_stmt(params)
-    records = (await session.scalars(stmt)).fetchall()
-    return [SysMenuDTO.model_validate(user, from_attributes=True) for user in records]
+    return await find_dto_list(stmt, SysMenuDTO, session)
 
 
 async def find_by_id(id, session) -> SysMenuDTO:
@@ -142,8 +140,7 @@ async def find_menu_list_by_user_id(dto: SysMenuQueryDTO, user_id: int, session:
     if dto.menu_type_list:
         stmt = stmt.where(SysMenu.menu_type.in_(dto.menu_type_list))
     stmt = stmt.order_by(SysMenu.parent_id, SysMenu.order_num)
-    records = (await session.scalars(stmt)).fetchall()
-    return [SysMenuDTO.model_validate(user, from_attributes=True) for user in records]
+    return await find_dto_list(stmt, SysMenuDTO, session)
 
 
 async def find_menu_permission_set_by_user_id(user_id: int, session: AsyncSession) -> Set[str]:
@@ -162,8 +159,7 @@ async def find_menu_list_by_role_id(role_id: int, session: AsyncSession) -> List
         SysMenu.menu_id == SysRoleMenu.menu_id,
         SysRoleMenu.role_id == role_id
     ))
-    records = (await session.scalars(stmt)).fetchall()
-    return [SysMenuDTO.model_validate(user, from_attributes=True) for user in records]
+    return await find_dto_list(stmt, SysMenuDTO, session)
 
 
 async def update_role_menus(role_id: int, menu_ids: List[int], session: AsyncSession) -> None:
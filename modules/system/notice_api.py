@@ -5,16 +5,16 @@ from core.depends import (
     CurrentUserId,
     login_required
 )
-from core.schema import PageParams, BaseResponse, TableDataInfo
+from core.schema import PageParams, BaseResponse, TableDataInfo, ModelRoute
 from modules.system.notice_service import (SysNoticeDTO, create, find_page, update, delete_by_ids, find_by_id)
 
-api = APIRouter(prefix='/system/notice', dependencies=[login_required])
+api = APIRouter(prefix='/system/notice', dependencies=[login_required], route_class=ModelRoute)
 
 
 @api.get('/list')
 async def find_page_endpoint(session: Session, page: PageParams, params: SysNoticeDTO = Depends()):
     rows, total = await find_page(params, page, session)
-    return TableDataInfo(rows=rows, total=total)
+    return TableDataInfo(rows=rows, total=total, next_cursor=page.next_cursor)
 
 
 @api.get('/{id}')
@@ -8,7 +8,7 @@ from sqlalchemy import (
 
 from core.exception import ApiException
 from core.schema import ResponseCode, PageParams, make_optional_dto
-from core.db import get_list_and_total
+from core.db import paginate
 
 from .table import SysNotice
 
@@ -24,8 +24,7 @@ async def find_page(params: SysNoticeDTO, page: PageParams,
         stmt = stmt.where(SysNotice.notice_type == params.notice_type)
     if params.status:
         stmt = stmt.where(SysNotice.status == params.status)
-    records, total = await get_list_and_total(stmt, page.page_num, page.page_size, session)
-    return [SysNoticeDTO.model_validate(user, from_attributes=True) for user in records], total
+    return await paginate(stmt, page, session, sort_keys=[SysNotice.notice_id], dto_type=SysNoticeDTO)
 
 
 async def find_by_id(id, session) -> SysNoticeDTO:
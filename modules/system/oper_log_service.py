@@ -0,0 +1,107 @@
+import re
+from typing import List
+
+from loguru import logger
+from sqlalchemy import select, insert
+
+from setting import setting
+from core.batch_writer import BatchWriter
+from core.db import async_session
+from core.request_log import RequestLogRecord, register_request_log_handler
+from core.schema import ResponseCode
+from .table import SysOperLog, SysUser, SysDept
+
+# 请求方式 -> 业务类型（0=其它,1=新增,2=修改,3=删除）
+BUSINESS_TYPES = dict(POST='1', PUT='2', DELETE='3')
+# 登录请求包含密码, 由登录日志记录
+EXCLUDE_PATHS = ('/login', '/logout')
+# 键名包含password的JSON字段值和表单/查询参数值. 记录的请求体可能在值的中间截断, 没有结束引号时脱敏到末尾
+_JSON_PASSWORD_PATTERN = re.compile(r'("[^"]*password[^"]*"\s*:\s*)("(?:[^"\\]|\\.)*(?:"|\\?$)|[^\s,}\]]+)',
+                                    re.IGNORECASE)
+_FORM_PASSWORD_PATTERN = re.compile(r'((?:^|[&?])[^=&]*password[^=&]*=)[^&]*', re.IGNORECASE)
+_MSG_PATTERN = re.compile(r'"msg"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_SUCCESS_PREFIX = f'{{"code":{ResponseCode.SUCCESS},'
+
+
+def _truncate(value, length: int):
+    return value[:length] if value else value
+
+
+def mask_passwords(params: str) -> str:
+    params = _JSON_PASSWORD_PATTERN.sub(r'\1"******"', params)
+    return _FORM_PASSWORD_PATTERN.sub(r'\1******', params)
+
+
+def _to_row(entry: dict, users: dict) -> dict:
+    """在后台任务中整理为表记录, 请求中只保存原始数据"""
+    record: RequestLogRecord = entry['record']
+    json_result = record.response_body
+    # 接口异常时HTTP状态为200, 响应中的code不是成功
+    failed = (record.error or record.status_code is None or record.status_code >= 400
+              or (json_result is not None and json_result.startswith('{"code":')
+                  and not json_result.startswith(_SUCCESS_PREFIX)))
+    error_msg = None
+    if failed:
+        match = _MSG_PATTERN.search(json_result or '')
+        error_msg = match.group(1) if match else 'request error'
+    user_name, dept_name = users.get(entry['user_id'], ('', ''))
+    params = record.request_body or record.query_string
+    path_parts = record.path.strip('/').split('/')
+    return dict(
+        title=_truncate(path_parts[1] if len(path_parts) > 1 else path_parts[0], 50),
+        business_type=BUSINESS_TYPES.get(record.method, '0'),
+        method=_truncate(entry['endpoint'], 100),
+        request_method=record.method,
+        operator_type='1',
+        oper_name=user_name or '',
+        dept_name=dept_name or '',
+        oper_url=_truncate(record.path, 255),
+        oper_ip=entry['ip'],
+        oper_param=_truncate(mask_passwords(params), 2000) if params else None,
+        json_result=_truncate(json_result, 2000),
+        status='1' if failed else '0',
+        error_msg=_truncate(error_msg, 2000),
+        oper_time=record.time,
+        cost_time=int(record.process_time * 1000),
+    )
+
+
+async def insert_oper_logs(entries: List[dict]) -> None:
+    """一次查询批次内所有操作人员和部门, 按executemany批量写入, 语句只编译一次"""
+    async with async_session() as session:
+        # 后台写入, 不使其他请求的读取走主库
+        session.info['read_your_writes'] = False
+        user_ids = {entry['user_id'] for entry in entries if entry['user_id'] is not None}
+        users = {}
+        if user_ids:
+            stmt = select(SysUser.user_id, SysUser.user_name, SysDept.dept_name).outerjoin(
+                SysDept, SysDept.dept_id == SysUser.dept_id).where(SysUser.user_id.in_(user_ids))
+            users = {user_id: (user_name, dept_name) for user_id, user_name, dept_name in await session.execute(stmt)}
+        await session.execute(insert(SysOperLog), [_to_row(entry, users) for entry in entries])
+        await session.commit()
+
+
+def _endpoint_name(endpoint) -> str:
+    # 挂载的子应用、可调用对象等没有__name__
+    if endpoint is None:
+        return ''
+    return f'{getattr(endpoint, "__module__", "")}.{getattr(endpoint, "__qualname__", type(endpoint).__name__)}'
+
+
+oper_log_writer = BatchWriter('sys_oper_log', insert_oper_logs, batch_size=setting.oper_log_batch_size,
+                              flush_interval=setting.oper_log_flush_interval, maxsize=setting.oper_log_queue_size)
+
+
+@register_request_log_handler
+def record_oper_log(scope: dict, record: RequestLogRecord) -> None:
+    """新增、修改、删除请求放入操作日志队列, 不在请求中写数据库"""
+    if not setting.oper_log_enabled or record.method not in BUSINESS_TYPES or record.path in EXCLUDE_PATHS:
+        return
+    auth = scope.get('state', {}).get('auth')
+    client = scope.get('client')
+    if not oper_log_writer.put(dict(
+            record=record,
+            user_id=auth.user_id if auth is not None else None,
+            endpoint=_endpoint_name(scope.get('endpoint')),
+            ip=client[0] if client else '')):
+        logger.opt(lazy=True).debug('oper log dropped: {} {}', lambda: record.method, lambda: record.path)
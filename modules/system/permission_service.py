@@ -0,0 +1,261 @@
+import asyncio
+import time
+from functools import partial
+from itertools import chain
+from typing import List, Set, FrozenSet, Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import select, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session as SyncSession
+
+from setting import setting
+from core.cache import (LRUCache, cache, invalidate, register_local_cache, single_flight, cache_fill_seconds,
+                        cache_payload_bytes, cache_invalidations)
+from core.codec import codec
+from core.db import run_in_session
+from core.warmup import register_warmer
+from .table import SysMenu, SysRoleMenu, SysUserRole, SysRole
+
+PERMISSION_NAMESPACE = 'user_permission'
+VERSION_KEY = f'{PERMISSION_NAMESPACE}:version'
+# 共享缓存中值的格式, 格式变化时修改, 升级期间不会读到旧格式的条目.
+# 旧格式为JSON文本, 位图为十进制字符串; 当前为codec编码, 位图为十六进制字符串
+VALUE_FORMAT = 'c1'
+# 影响权限的表和字段, None表示任意写入都影响
+_PERMISSION_COLUMNS = {
+    SysRoleMenu.__tablename__: None,
+    SysUserRole.__tablename__: None,
+    SysMenu.__tablename__: ('perms', 'status'),
+    SysRole.__tablename__: ('status', 'del_flag'),
+}
+
+# 进程内一级缓存, 多进程共享的缓存后端(Redis)为二级缓存. key中带版本号, 版本号递增后旧的key不会再被读取
+permission_cache = register_local_cache(LRUCache(PERMISSION_NAMESPACE, maxsize=setting.permission_cache_size,
+                                                 ttl=setting.permission_cache_ttl))
+# 缓存后端不是多进程共享时, 版本号保存在进程内
+_local_version = 0
+# Redis版本号的进程内缓存 (过期时间, 版本号)
+_version_memo = (0.0, 0)
+# 提交后还未写入Redis的版本号递增
+_pending_bumps: Set[asyncio.Task] = set()
+
+
+async def get_permission_version() -> int:
+    """权限版本号, 进程内缓存permission_version_ttl秒, 其他进程的变更最多延迟这么久生效"""
+    global _version_memo
+    if not cache.distributed:
+        return _local_version
+    if _pending_bumps:
+        await asyncio.gather(*list(_pending_bumps), return_exceptions=True)
+    expire_time, version = _version_memo
+    if expire_time < time.monotonic():
+        version = int(await cache.get(VERSION_KEY) or 0)
+        _version_memo = (time.monotonic() + setting.permission_version_ttl, version)
+    return version
+
+
+async def _bump_shared_version() -> None:
+    await cache.incr(VERSION_KEY)
+    # 旧版本的本地缓存不会再被读取, 通知各进程释放
+    await invalidate(PERMISSION_NAMESPACE)
+
+
+def bump_permission_version() -> None:
+    """递增权限版本号, 所有用户的权限缓存随之失效"""
+    global _local_version, _version_memo
+    _local_version += 1
+    _version_memo = (0.0, 0)
+    cache_invalidations.inc(namespace=PERMISSION_NAMESPACE, kind='version')
+    permission_cache.clear()
+    if cache.distributed:
+        task = asyncio.get_running_loop().create_task(_bump_shared_version())
+        _pending_bumps.add(task)
+        task.add_done_callback(_pending_bumps.discard)
+
+
+def _is_permission_change(obj, deleted: bool) -> bool:
+    table = getattr(obj, '__tablename__', None)
+    if table not in _PERMISSION_COLUMNS:
+        return False
+    columns = _PERMISSION_COLUMNS[table]
+    if columns is None or deleted:
+        return True
+    state = inspect(obj)
+    return any(state.attrs[column].history.has_changes() for column in columns)
+
+
+@event.listens_for(SyncSession, 'after_flush')
+def _record_flushed_permission_change(session, _):
+    if (any(_is_permission_change(obj, False) for obj in chain(session.new, session.dirty))
+            or any(_is_permission_change(obj, True) for obj in session.deleted)):
+        session.info['permission_changed'] = True
+
+
+@event.listens_for(SyncSession, 'do_orm_execute')
+def _record_dml_permission_change(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if orm_execute_state.statement.table.name in _PERMISSION_COLUMNS:
+            orm_execute_state.session.info['permission_changed'] = True
+
+
+@event.listens_for(SyncSession, 'after_commit')
+def _bump_committed_permission_change(session):
+    # 提交后再递增, 避免提交前其他请求读到旧数据写入新版本的缓存
+    if session.info.pop('permission_changed', False):
+        bump_permission_version()
+
+
+@event.listens_for(SyncSession, 'after_rollback')
+def _clear_permission_change(session):
+    session.info.pop('permission_changed', None)
+
+
+class PermissionRegistry:
+    """
+    权限标识到位序号的映射, 每个权限版本一份.
+    用户权限保存为整数位图, 校验时按预先计算的位掩码做位运算
+    """
+
+    def __init__(self, tokens: Sequence[str]):
+        self.tokens = list(tokens)
+        self.bits: Dict[str, int] = {token: 1 << i for i, token in enumerate(self.tokens)}
+        # (权限标识元组) -> (位掩码, 是否全部登记)
+        self._masks: Dict[Tuple[str, ...], Tuple[int, bool]] = {}
+
+    def to_bitmap(self, permissions: Iterable[str]) -> int:
+        bitmap = 0
+        for permission in permissions:
+            bitmap |= self.bits.get(permission, 0)
+        return bitmap
+
+    def to_set(self, bitmap: int) -> FrozenSet[str]:
+        return frozenset(token for token, bit in self.bits.items() if bitmap & bit)
+
+    def mask(self, paths: Tuple[str, ...]) -> Tuple[int, bool]:
+        result = self._masks.get(paths)
+        if result is None:
+            bits = [self.bits.get(path, 0) for path in paths]
+            mask = 0
+            for bit in bits:
+                mask |= bit
+            result = self._masks[paths] = (mask, 0 not in bits)
+        return result
+
+    def check(self, bitmap: int, paths: Tuple[str, ...], require_all: bool = True) -> bool:
+        mask, complete = self.mask(paths)
+        if require_all:
+            # 未登记的权限没有任何用户拥有
+            return complete and bitmap & mask == mask
+        return bitmap & mask != 0
+
+
+async def find_permission_tokens(session: AsyncSession) -> List[str]:
+    """所有菜单的权限标识, 排序后作为位序号"""
+    stmt = select(SysMenu.perms).where(SysMenu.perms.is_not(None), SysMenu.perms != '').distinct()
+    tokens = set()
+    for perms in await session.scalars(stmt):
+        tokens.update(perm for perm in perms.split(',') if perm)
+    return sorted(tokens)
+
+
+async def find_role_ids_by_user_id(user_id: int, session: AsyncSession) -> List[int]:
+    """用户正常状态的角色ID, 升序"""
+    stmt = select(SysUserRole.role_id).join(SysRole, SysRole.role_id == SysUserRole.role_id).where(
+        SysUserRole.user_id == user_id,
+        SysRole.del_flag == '0',
+        SysRole.status == '0'
+    ).order_by(SysUserRole.role_id)
+    return list((await session.scalars(stmt)).all())
+
+
+async def find_permission_set_by_role_ids(role_ids: List[int], session: AsyncSession) -> Set[str]:
+    if not role_ids:
+        return set()
+    stmt = select(SysMenu.perms).where(
+        SysMenu.status == '0',
+        SysMenu.menu_id.in_(select(SysRoleMenu.menu_id).where(SysRoleMenu.role_id.in_(role_ids)))
+    ).distinct()
+    permission_set = set()
+    for perms in await session.scalars(stmt):
+        if perms:
+            permission_set.update(perm for perm in perms.split(',') if perm)
+    return permission_set
+
+
+async def _get_or_load(key: str, loader, decode):
+    """
+    依次读取本地缓存、共享缓存和数据库, loader接收数据库会话, 返回可以用codec编码的值, decode转换后放入本地缓存.
+    等待的协程共用加载结果, 加载时新开会话, 不依赖发起加载的请求的会话
+    """
+    value = permission_cache.get(key)
+    if value is not None:
+        cache.record_request(key, 'hits')
+        return value
+    # 同一个key只有一个协程读取共享缓存和数据库
+    return await single_flight.do(key, lambda: _load(key, loader, decode))
+
+
+async def _load(key: str, loader, decode):
+    cache_bytes = await cache.get(key) if cache.distributed else None
+    if cache_bytes is not None:
+        cache.record_request(key, 'hits')
+        data = codec.decode(cache_bytes)
+    else:
+        cache.record_request(key, 'misses')
+        start = time.perf_counter()
+        data = await run_in_session(loader)
+        cache_fill_seconds.observe(time.perf_counter() - start, namespace=PERMISSION_NAMESPACE)
+        if cache.distributed:
+            payload = codec.encode(data)
+            cache_payload_bytes.observe(len(payload), namespace=PERMISSION_NAMESPACE)
+            # 其他进程已经写入时以先写入的为准, 同一版本各进程使用相同的位序号
+            if not await cache.set(key, payload, ex=setting.permission_cache_redis_ttl, nx=True):
+                cache_bytes = await cache.get(key)
+                if cache_bytes is not None:
+                    data = codec.decode(cache_bytes)
+    value = decode(data)
+    permission_cache.set(key, value)
+    return value
+
+
+async def get_permission_registry(version: Optional[int] = None) -> PermissionRegistry:
+    """权限标识位序号, 默认为当前权限版本"""
+    if version is None:
+        version = await get_permission_version()
+    key = f'{PERMISSION_NAMESPACE}:{version}:{VALUE_FORMAT}:registry'
+    return await _get_or_load(key, find_permission_tokens, PermissionRegistry)
+
+
+async def get_user_permission_bitmap(user_id: int) -> Tuple[PermissionRegistry, int]:
+    """
+    用户权限位图. 先按用户缓存角色ID集合, 再按角色ID集合缓存位图, 角色相同的用户共用一份缓存.
+    角色、菜单和用户角色变更时只递增版本号, 不需要逐个删除缓存
+    """
+    version = await get_permission_version()
+    prefix = f'{PERMISSION_NAMESPACE}:{version}:{VALUE_FORMAT}'
+    registry = await get_permission_registry(version)
+    role_ids = await _get_or_load(f'{prefix}:user:{user_id}', partial(find_role_ids_by_user_id, user_id), tuple)
+
+    async def load_bitmap(session: AsyncSession):
+        # 位图可能超过64位, 以十六进制字符串保存
+        return format(registry.to_bitmap(await find_permission_set_by_role_ids(list(role_ids), session)), 'x')
+
+    bitmap = await _get_or_load(f'{prefix}:roles:{",".join(map(str, role_ids))}', load_bitmap,
+                                lambda data: int(data, 16))
+    return registry, bitmap
+
+
+async def get_user_permissions(user_id: int) -> FrozenSet[str]:
+    registry, bitmap = await get_user_permission_bitmap(user_id)
+    return registry.to_set(bitmap)
+
+
+async def has_permissions(user_id: int, paths: Tuple[str, ...], require_all: bool = True) -> bool:
+    """require_all为True时需要拥有全部权限, 否则拥有任一权限即可"""
+    registry, bitmap = await get_user_permission_bitmap(user_id)
+    return registry.check(bitmap, paths, require_all)
+
+
+@register_warmer('permission')
+async def warmup_permission_registry(_: AsyncSession) -> list:
+    return [get_permission_registry]
@@ -6,18 +6,18 @@ from core.depends import (
     login_required
 )
 
-from core.schema import PageParams, BaseResponse, TableDataInfo
+from core.schema import PageParams, BaseResponse, TableDataInfo, ModelRoute
 
 from modules.system.post_service import (SysPostDTO, create_post, find_post_page, find_all,
                                          update_post, delete_post_by_ids, find_post_by_id)
 
-api = APIRouter(prefix='/system/post', dependencies=[login_required])
+api = APIRouter(prefix='/system/post', dependencies=[login_required], route_class=ModelRoute)
 
 
 @api.get('/list')
 async def find_post_page_endpoint(session: Session, page: PageParams, params: SysPostDTO = Depends()):
     rows, total = await find_post_page(params, page, session)
-    return TableDataInfo(rows=rows, total=total)
+    return TableDataInfo(rows=rows, total=total, next_cursor=page.next_cursor)
 
 
 @api.get('/{id}')
@@ -5,7 +5,7 @@ from sqlalchemy import select, delete, and_
 
 from core.exception import ApiException
 from core.schema import ResponseCode, PageParams, make_optional_dto
-from core.db import get_list_and_total, assert_key_unique
+from core.db import paginate, find_dto_list, assert_key_unique
 
 from .table import SysPost, SysUserPost
 
@@ -17,14 +17,12 @@ async def find_post_page(params: SysPostDTO, page: PageParams,
     stmt = select(SysPost)
     if params.post_name:
         stmt = stmt.where(SysPost.post_name.like('%' + params.post_name + '%'))
-    records, total = await get_list_and_total(stmt, page.page_num, page.page_size, session)
-    return [SysPostDTO.model_validate(user, from_attributes=True) for user in records], total
+    return await paginate(stmt, page, session, sort_keys=[SysPost.post_sort, SysPost.post_id], dto_type=SysPostDTO)
 
 
 async def find_all(session: AsyncSession) -> List[SysPostDTO]:
     stmt = select(SysPost)
-    records = (await session.scalars(stmt)).fetchall()
-    return [SysPostDTO.model_validate(e, from_attributes=True) for e in records]
+    return await find_dto_list(stmt, SysPostDTO, session)
 
 
 async def find_post_by_id(id, session) -> SysPostDTO:
@@ -70,8 +68,7 @@ async def find_by_user_id(user_id: int, session: AsyncSession) -> List[SysPostDT
         SysUserPost.post_id == SysPost.post_id,
         SysUserPost.user_id == user_id
     ))
-    entity_list = (await session.scalars(stmt)).fetchall()
-    return [SysPostDTO.model_validate(e, from_attributes=True) for e in entity_list]
+    return await find_dto_list(stmt, SysPostDTO, session)
 
 
 async def add_test_post_data(session) -> List[SysPost]:
@@ -5,12 +5,12 @@ from core.depends import (
     CurrentUserId,
     login_required
 )
-from core.schema import BaseResponse
+from core.schema import BaseResponse, ModelRoute
 from modules.system import user_service
 from modules.system import role_service
 from modules.system import post_service
 
-api = APIRouter(prefix='/system/user/profile', dependencies=[login_required])
+api = APIRouter(prefix='/system/user/profile', dependencies=[login_required], route_class=ModelRoute)
 
 
 @api.get('')
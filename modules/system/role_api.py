@@ -3,7 +3,7 @@ from fastapi import APIRouter, Depends
 from core.exception import ApiException
 from core.depends import Session, CurrentUserId, login_required
 
-from core.schema import PageParams, BaseResponse, TableDataInfo, ResponseCode
+from core.schema import PageParams, BaseResponse, TableDataInfo, ResponseCode, ModelRoute
 
 from modules.system.role_service import (SysRoleQueryDTO, SysRoleDTO, create_role, find_role_page,
                                          update_role, delete_role_by_ids, find_role_by_id, SysRoleChangeStatusDTO,
@@ -12,13 +12,13 @@ from modules.system.role_service import (SysRoleQueryDTO, SysRoleDTO, create_rol
 from modules.system import user_service
 from modules.system import dept_service
 
-api = APIRouter(prefix='/system/role', dependencies=[login_required])
+api = APIRouter(prefix='/system/role', dependencies=[login_required], route_class=ModelRoute)
 
 
 @api.get('/list')
 async def find_role_page_endpoint(session: Session, page: PageParams, params: SysRoleQueryDTO = Depends()):
     rows, total = await find_role_page(params, page, session)
-    return TableDataInfo(rows=rows, total=total)
+    return TableDataInfo(rows=rows, total=total, next_cursor=page.next_cursor)
 
 
 @api.get('/{id}')
@@ -73,13 +73,13 @@ async def find_option_select_endpoint(session: Session):
 @api.get('/authUser/allocatedList')
 async def find_allocated_user_list_endpoint(roleId: int, page: PageParams, session: Session):
     users, total = await user_service.find_page_by_role(roleId, page, session)
-    return TableDataInfo(rows=users, total=total)
+    return TableDataInfo(rows=users, total=total, next_cursor=page.next_cursor)
 
 
 @api.get('/authUser/unallocatedList')
 async def find_unallocated_user_list_endpoint(roleId: int, page: PageParams, session: Session):
     users, total = await user_service.find_page_exclude_role(roleId, page, session)
-    return TableDataInfo(rows=users, total=total)
+    return TableDataInfo(rows=users, total=total, next_cursor=page.next_cursor)
 
 
 @api.put('/authUser/cancel')
@@ -14,7 +14,8 @@ from setting import setting
 from core.exception import ApiException
 from core.schema import ResponseCode, PageParams, CamelModel
 from core.db import (
-    get_list_and_total,
+    paginate,
+    find_dto_list,
     transactional
 )
 from modules.system import menu_service
@@ -51,8 +52,7 @@ async def find_role_page(params: SysRoleQueryDTO, page: PageParams,
         stmt = stmt.where(SysRole.role_name.like(f'%{params.role_name}%'))
     if params.role_key:
         stmt = stmt.where(SysRole.role_key == params.role_key)
-    records, total = await get_list_and_total(stmt, page.page_num, page.page_size, session)
-    return [SysRoleDTO.model_validate(user, from_attributes=True) for user in records], total
+    return await paginate(stmt, page, session, sort_keys=[SysRole.role_id], dto_type=SysRoleDTO)
 
 
 async def find_role_by_id(id, session) -> SysRoleDTO:
@@ -118,7 +118,7 @@ async def is_name_unique(name: str, session: AsyncSession, before_id: int = None
 
 async def find_all(session: AsyncSession) -> List[SysRoleDTO]:
     stmt = select(SysRole).where(SysRole.del_flag == '0')
-    return [SysRoleDTO.model_validate(e, from_attributes=True) for e in (await session.scalars(stmt)).fetchall()]
+    return await find_dto_list(stmt, SysRoleDTO, session)
 
 
 async def assert_role_name_unique(role_name: str, session: AsyncSession, role_id: int = None):
@@ -147,8 +147,7 @@ async def find_by_user_id(user_id: int, session: AsyncSession) -> List[SysRoleDT
             SysUserRole.user_id == user_id,
             SysRole.del_flag == '0'
         ))
-    entity_list = (await session.scalars(stmt)).fetchall()
-    return [SysRoleDTO.model_validate(e, from_attributes=True) for e in entity_list]
+    return await find_dto_list(stmt, SysRoleDTO, session)
 
 
 async def find_role_permission_set_by_user_id(user_id: int, session: AsyncSession) -> Set[str]:
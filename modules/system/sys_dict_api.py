@@ -1,17 +1,17 @@
 from fastapi import Depends, APIRouter, Request
 
 from core.depends import CurrentUserId, Session, login_required
-from core.schema import BaseResponse, TableDataInfo, PageParams
+from core.schema import BaseResponse, TableDataInfo, PageParams, ModelRoute, RawDataResponse
 from .sys_dict_service import SysDictTypeDTO, SysDictDataDTO
 from . import sys_dict_service
 
-api = APIRouter(dependencies=[login_required])
+api = APIRouter(dependencies=[login_required], route_class=ModelRoute)
 
 
 @api.get('/system/dict/type/list')
 async def find_dict_type_endpoint(session: Session, page: PageParams, request: Request):
     dict_type_list, total = await sys_dict_service.find_dict_type_page(request.query_params, page, session)
-    return TableDataInfo(rows=dict_type_list, total=total)
+    return TableDataInfo(rows=dict_type_list, total=total, next_cursor=page.next_cursor)
 
 
 @api.post('/system/dict/type')
@@ -28,6 +28,13 @@ async def update_dict_type_endpoint(form: SysDictTypeDTO, user_id: CurrentUserId
     return BaseResponse()
 
 
+# 需要在 /system/dict/type/{dictIds} 之前注册
+@api.delete('/system/dict/type/refreshCache')
+async def refresh_cache_endpoint():
+    await sys_dict_service.clear_dict_cache()
+    return BaseResponse()
+
+
 @api.delete('/system/dict/type/{dictIds}')
 async def delete_dict_type_by_dict_ids_endpoint(dictIds: str, session: Session):
     id_list = [int(s) for s in dictIds.split(',')]
@@ -36,12 +43,6 @@ async def delete_dict_type_by_dict_ids_endpoint(dictIds: str, session: Session):
     return BaseResponse()
 
 
-@api.delete('/system/dict/type/refreshCache')
-async def refresh_cache_endpoint():
-    await sys_dict_service.clear_dict_cache()
-    return BaseResponse()
-
-
 @api.get('/system/dict/type/optionselect')
 async def find_dict_type_option_select_endpoint(session: Session):
     return BaseResponse(data=await sys_dict_service.find_all_dict_type(session))
@@ -55,12 +56,12 @@ async def get_dict_type_endpoint(dictId: int, session: Session):
 @api.get('/system/dict/data/list')
 async def find_dict_data_page_endpoint(session: Session, page: PageParams, params: SysDictDataDTO = Depends()):
     dict_data_list, total = await sys_dict_service.find_dict_data_page(params, page, session)
-    return TableDataInfo(rows=dict_data_list, total=total)
+    return TableDataInfo(rows=dict_data_list, total=total, next_cursor=page.next_cursor)
 
 
 @api.get('/system/dict/data/type/{dictType}')
-async def get_dict_data_endpoint(dictType: str, session: Session):
-    return BaseResponse(data=await sys_dict_service.find_dict_data_by_type(dictType, session))
+async def get_dict_data_endpoint(dictType: str):
+    return RawDataResponse(await sys_dict_service.find_dict_data_json_by_type(dictType))
 
 
 @api.post('/system/dict/data')
@@ -1,12 +1,14 @@
-import json
-from typing import List, Tuple
+from collections import defaultdict
+from functools import partial
+from typing import List, Optional, Tuple
 
 from sqlalchemy import select, asc, and_, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.schema import PageParams, make_optional_dto
-from core.db import get_list_and_total, assert_key_unique
-from core.redis import redis, clear_cache_by_namespace
+from core.schema import PageParams, make_optional_dto, list_adapter
+from core.db import paginate, find_dto_list, assert_key_unique, run_in_session
+from core.cache import cache, invalidate_on_commit
+from core.warmup import register_warmer
 from .table import SysDictType, SysDictData
 
 REDIS_NAMESPACE = 'sys_dict'
@@ -16,7 +18,7 @@ SysDictDataDTO = make_optional_dto(SysDictData)
 
 async def find_all_dict_type(session: AsyncSession) -> List[SysDictTypeDTO]:
     stmt = select(SysDictType)
-    return [SysDictTypeDTO.model_validate(r, from_attributes=True) for r in (await session.execute(stmt)).fetchall()]
+    return await find_dto_list(stmt, SysDictTypeDTO, session)
 
 
 async def find_dict_type_page(params, page: PageParams, session: AsyncSession) -> Tuple[List[SysDictTypeDTO], int]:
@@ -28,8 +30,7 @@ async def find_dict_type_page(params, page: PageParams, session: AsyncSession) -
             stmt = stmt.where(SysDictType.dict_type == params[key])
         elif key == 'status':
             stmt = stmt.where(SysDictType.status == params[key])
-    rows, total = await get_list_and_total(stmt, page.page_num, page.page_size, session=session)
-    return [SysDictTypeDTO.model_validate(row, from_attributes=True) for row in rows], total
+    return await paginate(stmt, page, session=session, sort_keys=[SysDictType.dict_id], dto_type=SysDictTypeDTO)
 
 
 async def find_dict_type_by_id(id: int, session: AsyncSession) -> SysDictTypeDTO:
@@ -50,7 +51,7 @@ async def create_dict_type(form: SysDictTypeDTO, operator: int, session: AsyncSe
     session.add(e)
     await session.flush()
 
-    await clear_cache_by_namespace(REDIS_NAMESPACE)
+    invalidate_on_commit(session, REDIS_NAMESPACE)
 
 
 async def update_dict_type(form: SysDictTypeDTO, operator_id: int, session: AsyncSession):
@@ -69,18 +70,18 @@ async def update_dict_type(form: SysDictTypeDTO, operator_id: int, session: Asyn
     e.update_by = operator_id
     await session.flush()
 
-    await clear_cache_by_namespace(REDIS_NAMESPACE)
+    invalidate_on_commit(session, REDIS_NAMESPACE)
 
 
 async def delete_dict_type_by_id_list(id_list: List[int], session: AsyncSession):
     stmt = delete(SysDictType).where(SysDictType.dict_id.in_(id_list))
     await session.execute(stmt)
 
-    await clear_cache_by_namespace(REDIS_NAMESPACE)
+    invalidate_on_commit(session, REDIS_NAMESPACE)
 
 
 async def clear_dict_cache():
-    await clear_cache_by_namespace(REDIS_NAMESPACE)
+    await cache.purge_namespace(REDIS_NAMESPACE)
 
 
 async def find_dict_data_page(params: SysDictDataDTO, page: PageParams,
@@ -92,9 +93,8 @@ async def find_dict_data_page(params: SysDictDataDTO, page: PageParams,
         stmt = stmt.where(SysDictData.dict_value.like(f'%{params.dict_value}%'))
     if params.dict_type:
         stmt = stmt.where(SysDictData.dict_type == params.dict_type)
-    stmt = stmt.order_by(asc(SysDictData.dict_sort))
-    rows, total = await get_list_and_total(stmt, page.page_num, page.page_size, session=session)
-    return [SysDictDataDTO.model_validate(row, from_attributes=True) for row in rows], total
+    return await paginate(stmt, page, session=session,
+                          sort_keys=[SysDictData.dict_sort, SysDictData.dict_code], dto_type=SysDictDataDTO)
 
 
 async def find_dict_data_by_id(id: int, session: AsyncSession) -> SysDictDataDTO:
@@ -108,7 +108,7 @@ async def create_dict_data(form: SysDictDataDTO, operator_id: int, session: Asyn
     session.add(e)
     await session.flush()
 
-    await clear_cache_by_namespace(REDIS_NAMESPACE)
+    invalidate_on_commit(session, REDIS_NAMESPACE)
 
 
 async def update_dict_data(form: SysDictDataDTO, operator_id: int, session: AsyncSession):
@@ -118,31 +118,48 @@ async def update_dict_data(form: SysDictDataDTO, operator_id: int, session: Asyn
     e.update_by = operator_id
     await session.flush()
 
-    await clear_cache_by_namespace(REDIS_NAMESPACE)
+    invalidate_on_commit(session, REDIS_NAMESPACE)
 
 
 async def delete_dict_data_by_id_list(id_list: List[int], session: AsyncSession):
     stmt = delete(SysDictData).where(SysDictData.dict_code.in_(id_list))
     await session.execute(stmt)
 
-    await clear_cache_by_namespace(REDIS_NAMESPACE)
-
+    invalidate_on_commit(session, REDIS_NAMESPACE)
 
-async def find_dict_data_by_type(dict_type: str, session: AsyncSession) -> List[SysDictDataDTO]:
-    cache_key = f'{REDIS_NAMESPACE}:find_dict_data_by_type:{dict_type}'
-    cache_value_str = await redis.get(cache_key)
-    if cache_value_str:
-        data_list = json.loads(cache_value_str)
-        return [SysDictDataDTO.model_validate(item) for item in data_list]
 
+async def _load_dict_data_by_type(dict_type: str, session: AsyncSession) -> Optional[List[SysDictDataDTO]]:
     stmt = select(SysDictData).where(and_(
         SysDictData.dict_type == dict_type
     ))
     stmt = stmt.order_by(asc(SysDictData.dict_sort))
-    records = (await session.scalars(stmt)).fetchall()
-    result_list = [SysDictDataDTO.model_validate(item, from_attributes=True) for item in records]
+    # 没有数据时返回None, 写入负缓存
+    return await find_dto_list(stmt, SysDictDataDTO, session) or None
+
+
+async def _dict_data_cache_key(dict_type: str) -> str:
+    return await cache.namespace_key(REDIS_NAMESPACE, f'find_dict_data_by_type:{dict_type}')
+
+
+async def find_dict_data_json_by_type(dict_type: str) -> bytes:
+    """字典数据列表的JSON, 缓存命中时不经过pydantic, 可以直接写入响应"""
+    cache_key = await _dict_data_cache_key(dict_type)
+    # 等待同一个key的请求共用加载结果, 加载时新开会话, 不依赖发起加载的请求的会话
+    loader = partial(run_in_session, partial(_load_dict_data_by_type, dict_type))
+    value = await cache.get_or_fill(cache_key, loader, ex=3600, refresh=loader, raw=True)
+    return b'[]' if value is None else value
+
+
+async def find_dict_data_by_type(dict_type: str) -> List[SysDictDataDTO]:
+    return list_adapter(SysDictDataDTO).validate_json(await find_dict_data_json_by_type(dict_type))
 
-    data_list = [item.model_dump() for item in result_list]
-    await redis.set(cache_key, json.dumps(data_list), ex=3600)
 
-    return result_list
+@register_warmer('sys_dict')
+async def warmup_dict_cache(session: AsyncSession) -> list:
+    """一次查出所有字典数据, 按类型分组写入缓存"""
+    stmt = select(SysDictData).order_by(SysDictData.dict_type, asc(SysDictData.dict_sort))
+    groups = defaultdict(list)
+    for dict_data in await find_dto_list(stmt, SysDictDataDTO, session):
+        groups[dict_data.dict_type].append(dict_data)
+    return [partial(cache.put, await _dict_data_cache_key(dict_type), dict_data_list, ex=3600)
+            for dict_type, dict_data_list in groups.items()]
@@ -3,7 +3,7 @@ from typing import List
 from fastapi import APIRouter, Depends, Request
 from core.depends import CurrentUserId, Session, login_required
 
-from core.schema import PageParams, BaseResponse, TableDataInfo, CamelModel
+from core.schema import PageParams, BaseResponse, TableDataInfo, CamelModel, ModelRoute
 from modules.system.user_service import (create_user, delete_user_by_ids, reset_user_password, CreateSysUserDTO,
                                          SysUserDTO, UpdateSysUserDTO, SysUserIdDTO, update_user_status, find_user_page,
                                          update_user, get_user_by_id, UserQueryParams, refresh_user_roles)
@@ -11,14 +11,14 @@ from modules.system import role_service
 from modules.system import post_service
 from modules.system import dept_service
 
-api = APIRouter(dependencies=[login_required])
+api = APIRouter(dependencies=[login_required], route_class=ModelRoute)
 endpoint_prefix = '/system/user'
 
 
 @api.get(endpoint_prefix + '/list')
 async def user_list_endpoint(session: Session, page: PageParams, params: UserQueryParams = Depends()):
     rows, total = await find_user_page(params, page, session=session)
-    return TableDataInfo(rows=rows, total=total)
+    return TableDataInfo(rows=rows, total=total, next_cursor=page.next_cursor)
 
 
 @api.get(endpoint_prefix + '/')
@@ -13,7 +13,7 @@ from setting import setting
 from core.exception import ApiException
 from core.schema import ResponseCode
 from core.schema import PageParams, CamelModel
-from core.db import get_list_and_total, transactional, assert_key_unique
+from core.db import paginate, transactional, assert_key_unique
 from modules.system import dept_service
 from .table import SysUser, SysDept, SysUserRole, SysUserPost
 
@@ -186,7 +186,6 @@ async def find_user_page(
         page: PageParams,
         session: AsyncSession) -> Tuple[List[SysUserDTO], int]:
     stmt = select(SysUser).where(SysUser.del_flag == '0')
-    stmt = stmt.outerjoin(SysDept, SysUser.dept_id == SysDept.dept_id)
     if params.user_id:
         stmt = stmt.where(SysUser.user_id == params.user_id)
     if params.user_name:
@@ -200,7 +199,9 @@ async def find_user_page(
     if params.end_time:
         stmt = stmt.where(SysUser.create_time <= params.end_time)
     if params.dept_id:
+        # 只在按部门过滤时连接部门表, 列表和总数查询都不需要多余的连接
         dept = await session.get(SysDept, params.dept_id)
+        stmt = stmt.outerjoin(SysDept, SysUser.dept_id == SysDept.dept_id)
         stmt = stmt.where(or_(
             and_(
                 SysDept.del_flag == '0',
@@ -208,14 +209,13 @@ async def find_user_page(
             ),
             SysUser.dept_id == params.dept_id
         ))
-    records, total = await get_list_and_total(stmt, page.page_num, page.page_size, session)
+    dto_list, total = await paginate(stmt, page, session, sort_keys=[SysUser.user_id], dto_type=SysUserDTO)
 
-    dto_list = []
-    for record in records:
-        dto = SysUserDTO.model_validate(record, from_attributes=True)
+    # 一次查出本页用户的部门, 避免逐个用户查询
+    dept_map = await dept_service.find_dept_map_by_ids({dto.dept_id for dto in dto_list if dto.dept_id}, session)
+    for dto in dto_list:
         if dto.dept_id:
-            dto.dept = await dept_service.find_dept_by_id(dto.dept_id, session=session)
-        dto_list.append(dto)
+            dto.dept = dept_map.get(dto.dept_id)
     return dto_list, total
 
 
@@ -244,20 +244,16 @@ async def find_page_by_role(role_id: int, page: PageParams, session: AsyncSessio
         SysUserRole.role_id == role_id,
         SysUser.user_id == SysUserRole.user_id
     ))
-    users, total = await get_list_and_total(stmt, page.page_num, page.page_size, session)
-    return [SysUserDTO.model_validate(user, from_attributes=True) for user in users], total
+    return await paginate(stmt, page, session, sort_keys=[SysUser.user_id], dto_type=SysUserDTO)
 
 
 async def find_page_exclude_role(role_id: int, page: PageParams, session: AsyncSession) -> Tuple[List[SysUserDTO], int]:
-    stmt = select(SysUser).outerjoin(SysUserRole, SysUser.user_id == SysUserRole.user_id).where(and_(
+    # 用NOT IN代替外连接, 保证每个用户只出现一次, 游标分页依赖排序键唯一
+    stmt = select(SysUser).where(and_(
         SysUser.del_flag == '0',
-        or_(
-            SysUserRole.role_id != role_id,
-            SysUserRole.role_id == None
-        )
+        SysUser.user_id.not_in(select(SysUserRole.user_id).where(SysUserRole.role_id == role_id))
     ))
-    users, total = await get_list_and_total(stmt, page.page_num, page.page_size, session)
-    return [SysUserDTO.model_validate(user, from_attributes=True) for user in users], total
+    return await paginate(stmt, page, session, sort_keys=[SysUser.user_id], dto_type=SysUserDTO)
 
 
 async def _count_by_username(username: str, session: AsyncSession) -> int:
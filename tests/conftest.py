@@ -1,6 +1,8 @@
 import os
 
 os.environ.setdefault('ENV', 'test')
+# 内存数据库只有一个连接, 后台写入操作日志会和其他测试的事务交错, 只在操作日志的测试中开启
+os.environ.setdefault('OPER_LOG_ENABLED', 'false')
 
 import asyncio
 from asgi_lifespan import LifespanManager
@@ -39,6 +41,7 @@ async def client(event_loop):
 async def session(event_loop):
     from core.db import is_memory_engine, engine, Base, async_session
     from tests.db_init import init_all
+    import modules.system.table  # noqa: F401 单独运行不涉及表的测试时也要注册所有表
 
     if is_memory_engine:
         async with engine.connect() as conn:
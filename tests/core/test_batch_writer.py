@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from core.batch_writer import BatchWriter, batch_writers, batch_writer_items
+
+
+@pytest.mark.asyncio
+async def test_batch_writer():
+    batches = []
+
+    async def flush(batch):
+        batches.append(list(batch))
+
+    writer = BatchWriter('test_batch', flush, batch_size=3, flush_interval=0.05, maxsize=10)
+    try:
+        # 未启动时不接收
+        assert not writer.put(0)
+        writer.start()
+        for i in range(4):
+            assert writer.put(i)
+        await asyncio.sleep(0.01)
+        # 攒够batch_size条立即写入, 剩余的等flush_interval
+        assert batches == [[0, 1, 2]]
+        await asyncio.sleep(0.1)
+        assert batches == [[0, 1, 2], [3]]
+
+        # 关闭时写完队列中的数据
+        for i in range(5):
+            writer.put(i)
+        await writer.stop()
+        assert sum(len(batch) for batch in batches) == 9
+        assert batch_writer_items.get(writer='test_batch', result='written') == 9
+    finally:
+        batch_writers.pop('test_batch')
+
+
+@pytest.mark.asyncio
+async def test_batch_writer_backpressure():
+    async def flush(_):
+        raise RuntimeError('database down')
+
+    writer = BatchWriter('test_backpressure', flush, batch_size=10, flush_interval=10, maxsize=2)
+    try:
+        writer.start()
+        assert writer.put(1) and writer.put(2)
+        # 队列满时丢弃
+        assert not writer.put(3)
+        assert writer.stats()['high_water'] == 2
+        await writer.stop()
+        assert batch_writer_items.get(writer='test_backpressure', result='dropped') == 1
+        assert batch_writer_items.get(writer='test_backpressure', result='failed') == 2
+    finally:
+        batch_writers.pop('test_backpressure')
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from core import cache
+from core.cache import LRUCache
+
+
+@pytest.fixture
+def local_caches(monkeypatch):
+    """测试中登记的本地缓存在测试结束后移除"""
+    monkeypatch.setattr(cache, 'local_caches', dict(cache.local_caches))
+
+
+def test_lru_cache(local_caches):
+    lru = LRUCache('test_lru', maxsize=2, ttl=60)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    # b最久未使用, 被淘汰
+    lru.set('c', 3)
+    assert lru.get('b') is None
+    assert lru.get('c') == 3
+    assert lru.stats()['evictions'] == 1
+    assert lru.hits == 2 and lru.misses == 1
+    # 只有显式登记的本地缓存参与失效通知和监控
+    assert 'test_lru' not in cache.local_caches
+    cache.register_local_cache(LRUCache('test_register'))
+    with pytest.raises(ValueError):
+        cache.register_local_cache(LRUCache('test_register'))
+
+
+def test_lru_cache_ttl(monkeypatch):
+    lru = LRUCache('test_lru_ttl', maxsize=2, ttl=10)
+    lru.set('a', 1)
+    now = time.monotonic()
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now + 11)
+    assert lru.get('a') is None
+    assert lru.expirations == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate(local_caches):
+    lru = cache.register_local_cache(LRUCache('test_invalidate'))
+    lru.set('a', 1)
+    lru.set('b', 2)
+    await cache.invalidate('test_invalidate', ['a'])
+    assert lru.get('a') is None and lru.get('b') == 2
+    await cache.invalidate('test_invalidate')
+    assert len(lru) == 0
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = messages
+        self.channels = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def listen(self):
+        for message in self.messages:
+            yield message
+        await asyncio.Event().wait()
+
+
+@pytest.mark.asyncio
+async def test_invalidation_listener(monkeypatch, local_caches):
+    lru = cache.register_local_cache(LRUCache('test_listener'))
+    lru.set('a', 1)
+    lru.set('b', 2)
+    pubsub = FakePubSub([dict(type='subscribe', data=1),
+                         dict(type='message', data=json.dumps(dict(namespace='test_listener', keys=['a'])))])
+
+    class FakeClient:
+        def pubsub(self):
+            return pubsub
+
+    class FakeBackend:
+        client = FakeClient()
+
+    monkeypatch.setattr(cache, 'cache', FakeBackend())
+    task = asyncio.create_task(cache._listen_invalidation())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert pubsub.channels == [cache.INVALIDATE_CHANNEL]
+    assert lru.get('a') is None and lru.get('b') == 2
+
+
+@pytest.mark.asyncio
+async def test_local_cache_backend(monkeypatch):
+    backend = cache.LocalCache(maxsize=100, default_ttl=60)
+    assert await backend.set('ns:a', '1', ex=10)
+    assert not await backend.set('ns:a', '2', nx=True)
+    await backend.set('ns:b', '2')
+    await backend.set('other:c', '3')
+    assert await backend.mget(['ns:a', 'ns:b', 'ns:x']) == [b'1', b'2', None]
+    assert await backend.incr('counter') == 1
+    assert await backend.incr('counter') == 2
+
+    now = time.monotonic()
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now + 11)
+    assert await backend.get('ns:a') is None
+    assert await backend.set('ns:a', '2', nx=True)
+
+    await backend.purge_namespace('ns')
+    assert await backend.namespace_keys('ns') == []
+    assert await backend.get('other:c') == b'3'
+
+
+@pytest.mark.asyncio
+async def test_namespace_generation():
+    backend = cache.LocalCache(maxsize=100, default_ttl=60)
+    key = await backend.namespace_key('ns', 'a')
+    await backend.set(key, '1')
+    assert await backend.invalidate_namespace('ns') == 1
+    new_key = await backend.namespace_key('ns', 'a')
+    assert new_key != key
+    assert await backend.get(new_key) is None
+
+
+@pytest.mark.asyncio
+async def test_get_or_fill_single_flight():
+    backend = cache.LocalCache(maxsize=100, default_ttl=60)
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 'value'
+
+    results = await asyncio.gather(*[backend.get_or_fill('ns:a', load) for _ in range(20)])
+    assert results == ['value'] * 20
+    assert calls == 1
+    assert cache.codec.decode(cache.unpack_entry(await backend.get('ns:a'))[1]) == 'value'
+
+
+@pytest.mark.asyncio
+async def test_get_or_fill_lock(monkeypatch):
+    class SharedCache(cache.LocalCache):
+        distributed = True
+
+    monkeypatch.setattr(cache.setting, 'cache_fill_lock_ms', 1000)
+    monkeypatch.setattr(cache.setting, 'cache_fill_lock_wait', 0.001)
+    backend = SharedCache(maxsize=100, default_ttl=60)
+
+    # 其他进程持有锁, 写入后等待方直接读取
+    await backend.set(f'{cache.FILL_LOCK_PREFIX}:ns:a', 'other', px=1000, nx=True)
+
+    async def other_worker_fill():
+        await asyncio.sleep(0.01)
+        await backend.set('ns:a', cache.pack_entry(cache.codec.encode('filled'), time.time() + 60))
+
+    async def load():
+        raise AssertionError('should wait for the lock holder')
+
+    _, value = await asyncio.gather(other_worker_fill(), backend.get_or_fill('ns:a', load))
+    assert value == 'filled'
+
+    # 拿到锁的进程加载后释放锁
+    assert await backend.get_or_fill('ns:b', lambda: asyncio.sleep(0, 'loaded')) == 'loaded'
+    assert await backend.get(f'{cache.FILL_LOCK_PREFIX}:ns:b') is None
+
+
+@pytest.mark.asyncio
+async def test_get_or_fill_stale_while_revalidate(monkeypatch):
+    backend = cache.LocalCache(maxsize=100, default_ttl=60)
+    versions = iter(['v1', 'v2', 'v3'])
+
+    async def load():
+        return next(versions)
+
+    assert await backend.get_or_fill('swr:a', load, soft_ttl=10, refresh=load) == 'v1'
+    now = time.time()
+    monkeypatch.setattr(cache.time, 'time', lambda: now + 11)
+    # 软过期后先返回旧值, 后台刷新完成后返回新值
+    assert await backend.get_or_fill('swr:a', load, soft_ttl=10, refresh=load) == 'v1'
+    await backend.close()
+    assert await backend.get_or_fill('swr:a', load, soft_ttl=10, refresh=load) == 'v2'
+    stats = {item['namespace']: item for item in backend.fill_stats()}['swr']
+    assert (stats['misses'], stats['stale'], stats['hits'], stats['refreshes']) == (1, 1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_get_or_fill_during_refresh(monkeypatch):
+    backend = cache.LocalCache(maxsize=100, default_ttl=60)
+    refreshing = asyncio.Event()
+
+    async def slow_refresh():
+        await refreshing.wait()
+        return 'refreshed'
+
+    await backend.get_or_fill('during:a', lambda: asyncio.sleep(0, 'v1'), soft_ttl=10, refresh=slow_refresh)
+    now = time.time()
+    monkeypatch.setattr(cache.time, 'time', lambda: now + 11)
+    assert await backend.get_or_fill('during:a', slow_refresh, soft_ttl=10, refresh=slow_refresh) == 'v1'
+    # 刷新期间条目被删除, 同步加载不会等到刷新任务的结果
+    await backend.delete('during:a')
+    assert await backend.get_or_fill('during:a', lambda: asyncio.sleep(0, 'v2'), soft_ttl=10) == 'v2'
+    refreshing.set()
+    await backend.close()
+    assert await backend.get_or_fill('during:a', slow_refresh, soft_ttl=10, refresh=slow_refresh) == 'refreshed'
+
+
+@pytest.mark.asyncio
+async def test_get_or_fill_refresh_ahead(monkeypatch):
+    monkeypatch.setattr(cache.setting, 'cache_refresh_ahead', 5)
+    monkeypatch.setattr(cache.setting, 'cache_refresh_ahead_hits', 3)
+    backend = cache.LocalCache(maxsize=100, default_ttl=60)
+    versions = iter(['v1', 'v2'])
+
+    async def load():
+        return next(versions)
+
+    await backend.get_or_fill('ahead:a', load, soft_ttl=10, refresh=load)
+    now = time.time()
+    monkeypatch.setattr(cache.time, 'time', lambda: now + 6)
+    # 快到软过期时被频繁访问, 第3次命中触发提前刷新
+    for _ in range(3):
+        assert await backend.get_or_fill('ahead:a', load, soft_ttl=10, refresh=load) == 'v1'
+    await backend.close()
+    assert await backend.get_or_fill('ahead:a', load, soft_ttl=10, refresh=load) == 'v2'
+    stats = {item['namespace']: item for item in backend.fill_stats()}['ahead']
+    assert stats['refresh_ahead'] == 1 and stats['stale'] == 0
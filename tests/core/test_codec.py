@@ -0,0 +1,24 @@
+import json
+
+from core.codec import Codec, COMPRESSED, FORMAT_JSON
+from core.schema import RawDataResponse, BaseResponse, dump_json
+from modules.system.sys_dict_service import SysDictDataDTO
+
+
+def test_codec_compress():
+    codec = Codec(compress_threshold=100)
+    small = codec.encode(['a'])
+    assert small[0] == FORMAT_JSON and codec.decode(small) == ['a']
+
+    rows = [SysDictDataDTO(dict_code=i, dict_label=f'标签{i}', dict_value=str(i)) for i in range(100)]
+    data = codec.encode(rows)
+    assert data[0] == FORMAT_JSON | COMPRESSED
+    assert len(data) < len(dump_json(rows))
+    assert codec.decode_json(data) == dump_json(rows)
+    assert codec.decode(data)[0]['dictLabel'] == '标签0'
+
+
+def test_raw_data_response():
+    rows = [SysDictDataDTO(dict_code=1, dict_label='是', dict_value='Y')]
+    response = RawDataResponse(dump_json(rows), msg='ok')
+    assert json.loads(response.body) == json.loads(dump_json(BaseResponse(msg='ok', data=rows)))
@@ -0,0 +1,167 @@
+import pytest
+from sqlalchemy import select
+
+from core import db
+from core.db import get_list_and_total, find_dto_list
+from modules.system.table import SysUser, SysPost
+from modules.system.post_service import SysPostDTO
+
+
+@pytest.mark.asyncio
+async def test_list_and_total(session):
+    stmt = select(SysPost)
+    records, total = await get_list_and_total(stmt, 1, 2, session, sort_keys=[SysPost.post_id])
+    assert len(records) == 2
+    assert total == 4
+
+    # 超出最后一页时窗口函数拿不到总数, 回退为count查询
+    db.clear_count_cache()
+    records, total = await get_list_and_total(stmt, 10, 2, session)
+    assert len(records) == 0
+    assert total == 4
+
+    # DISTINCT和GROUP BY的总数不能用窗口函数计算
+    for stmt in (select(SysPost.status).distinct(), select(SysPost.status).group_by(SysPost.status)):
+        db.clear_count_cache()
+        records, total = await get_list_and_total(stmt, 1, 10, session)
+        assert total == len(records) == 1
+
+
+@pytest.mark.asyncio
+async def test_dto_list(session):
+    stmt = select(SysPost).where(SysPost.post_id > 1).order_by(SysPost.post_id)
+    dto_list = await find_dto_list(stmt, SysPostDTO, session)
+    entity_list = (await session.scalars(stmt)).fetchall()
+    assert dto_list == [SysPostDTO.model_validate(e, from_attributes=True) for e in entity_list]
+
+    db.clear_count_cache()
+    records, total = await get_list_and_total(select(SysPost), 1, 2, session,
+                                              sort_keys=[SysPost.post_id], dto_type=SysPostDTO)
+    assert all(isinstance(r, SysPostDTO) for r in records)
+    assert [r.post_id for r in records] == sorted(r.post_id for r in records)
+    assert len(records) == 2
+    assert total == 4
+
+
+@pytest.mark.asyncio
+async def test_known_total_and_skip_count(session):
+    stmt = select(SysPost)
+    _, total = await get_list_and_total(stmt, 2, 2, session, known_total=100)
+    assert total == 100
+    _, total = await get_list_and_total(stmt, 2, 2, session, skip_count=True)
+    assert total is None
+
+
+@pytest.mark.asyncio
+async def test_count_cache_evict_on_write(session):
+    stmt = select(SysUser).where(SysUser.del_flag == '0')
+    _, total = await get_list_and_total(stmt, 1, 10, session)
+    assert total == 2
+
+    user = await session.get(SysUser, 2)
+    user.del_flag = '2'
+    await session.commit()
+
+    _, total = await get_list_and_total(stmt, 1, 10, session)
+    assert total == 1
+
+
+def test_count_cache_ttl(monkeypatch):
+    monkeypatch.setattr(db.setting, 'page_count_cache_ttl', None)
+    monkeypatch.setattr(db.setting, 'cache_backend', None)
+    monkeypatch.setattr(db.setting, 'redis_url', None)
+    assert db._count_cache_ttl() == 10
+    # 多进程共用Redis时, 进程内的总数缓存不会因其他进程的写入失效, 默认不缓存
+    monkeypatch.setattr(db.setting, 'redis_url', 'redis://localhost')
+    assert db._count_cache_ttl() == 0
+    monkeypatch.setattr(db.setting, 'page_count_cache_ttl', 5)
+    assert db._count_cache_ttl() == 5
+
+
+@pytest.mark.asyncio
+async def test_routing_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, '_primary_until', 0.0)
+    primary = db.create_engine(f'sqlite+aiosqlite:///{tmp_path}/primary.db')
+    replica = db.create_engine(f'sqlite+aiosqlite:///{tmp_path}/replica.db')
+    for e, post_name in ((primary, 'primary'), (replica, 'replica')):
+        async with e.begin() as conn:
+            await conn.run_sync(SysPost.__table__.create)
+            await conn.execute(SysPost.__table__.insert().values(
+                post_id=1, post_code='code', post_name=post_name, create_by='1'))
+    session_factory = db.make_session_factory(primary, [replica])
+
+    # 只读查询走从库
+    async with session_factory() as s:
+        assert await s.scalar(select(SysPost.post_name)) == 'replica'
+
+    # 写入之后同一个会话的读取走主库
+    async with session_factory() as s:
+        s.add(SysPost(post_code='code2', post_name='new', create_by='1'))
+        await s.flush()
+        assert await s.scalar(select(SysPost.post_name).where(SysPost.post_id == 1)) == 'primary'
+        await s.commit()
+
+    # 提交后的一段时间内其他会话也读主库
+    async with session_factory() as s:
+        assert await s.scalar(select(SysPost.post_name).where(SysPost.post_id == 1)) == 'primary'
+
+    monkeypatch.setattr(db, '_primary_until', 0.0)
+    async with session_factory() as s:
+        assert await s.scalar(select(SysPost.post_name).where(SysPost.post_id == 1)) == 'replica'
+
+    # 请求会话: 只有写入者自己的读取走主库
+    monkeypatch.setattr(db, '_writer_primary_until', {})
+    async with session_factory() as s:
+        s.info['writer'] = 'a'
+        s.add(SysPost(post_code='code3', post_name='new', create_by='1'))
+        await s.commit()
+    for writer, post_name in (('a', 'primary'), ('b', 'replica')):
+        async with session_factory() as s:
+            s.info['writer'] = writer
+            assert await s.scalar(select(SysPost.post_name).where(SysPost.post_id == 1)) == post_name
+
+    # 后台写入不影响读取路由
+    monkeypatch.setattr(db, '_primary_until', 0.0)
+    async with session_factory() as s:
+        s.info['read_your_writes'] = False
+        s.add(SysPost(post_code='code4', post_name='new', create_by='1'))
+        await s.commit()
+    assert db._primary_until == 0.0
+
+    await primary.dispose()
+    await replica.dispose()
+    # 临时engine不登记, 不影响应用的连接池统计
+    assert db.pool_stats['primary'][0] is db.engine
+    with pytest.raises(ValueError):
+        db.create_engine(f'sqlite+aiosqlite:///{tmp_path}/other.db', 'primary')
+
+
+@pytest.mark.asyncio
+async def test_unused_session_not_checkout():
+    primary_engine, primary_stats = db.pool_stats['primary']
+    assert primary_engine is db.engine
+    checkouts = primary_stats.checkouts
+    unused = db.session_stats.unused
+
+    session_gen = db.get_session()
+    await session_gen.__anext__()
+    with pytest.raises(StopAsyncIteration):
+        await session_gen.__anext__()
+
+    assert primary_stats.checkouts == checkouts
+    assert db.session_stats.unused == unused + 1
+
+    # 执行SQL时会取出连接
+    async with db.async_session() as s:
+        await s.execute(select(1))
+    assert primary_stats.checkouts > checkouts
+
+
+@pytest.mark.asyncio
+async def test_warmup_engines_skip_unreachable(tmp_path, monkeypatch):
+    monkeypatch.setattr(db.setting, 'database_pool_warmup', 2)
+    unreachable = db.create_engine(f'sqlite+aiosqlite:///{tmp_path}/missing/replica.db')
+    monkeypatch.setitem(db.pool_stats, 'replica', (unreachable, db.pool_stats['primary'][1]))
+    # 不可用的从库只记录警告, 不影响启动
+    await db.warmup_engines()
+    await unreachable.dispose()
@@ -0,0 +1,29 @@
+import time
+
+import pytest
+
+from core import jwt
+from core.exception import ApiException
+
+
+def test_jwt_decode_cache():
+    token = jwt.jwt_encode(dict(user_id=1), 60)
+    hits = jwt.verified_tokens.hits
+    assert jwt.jwt_decode(token)['user_id'] == 1
+    assert jwt.jwt_decode(token)['user_id'] == 1
+    assert jwt.verified_tokens.hits == hits + 1
+
+
+def test_jwt_decode_cache_honours_exp():
+    # 缓存期间过期的token
+    token = jwt.jwt_encode(dict(user_id=1), -10)
+    jwt.verified_tokens.set(token, dict(user_id=1, exp=time.time() - 10))
+    with pytest.raises(ApiException):
+        jwt.jwt_decode(token)
+    assert jwt.verified_tokens.get(token) is None
+
+
+def test_jwt_decode_invalid():
+    with pytest.raises(ApiException):
+        jwt.jwt_decode('invalid')
+    assert jwt.verified_tokens.get('invalid') is None
@@ -0,0 +1,23 @@
+from core.metrics import Counter, Histogram, metrics, render_metrics
+
+
+def test_render_metrics():
+    counter = Counter('test_requests_total', 'Test requests', ['result'])
+    histogram = Histogram('test_latency_seconds', 'Test latency', ['namespace'], buckets=(0.1, 1))
+    try:
+        counter.inc(result='hit')
+        counter.inc(2, result='miss')
+        histogram.observe(0.05, namespace='a')
+        histogram.observe(0.5, namespace='a')
+        histogram.observe(5, namespace='a')
+        text = render_metrics()
+        assert '# TYPE test_requests_total counter' in text
+        assert 'test_requests_total{result="miss"} 2' in text
+        assert 'test_latency_seconds_bucket{namespace="a",le="0.1"} 1' in text
+        assert 'test_latency_seconds_bucket{namespace="a",le="1"} 2' in text
+        assert 'test_latency_seconds_bucket{namespace="a",le="+Inf"} 3' in text
+        assert 'test_latency_seconds_sum{namespace="a"} 5.55' in text
+        assert 'test_latency_seconds_count{namespace="a"} 3' in text
+    finally:
+        metrics.pop(counter.name)
+        metrics.pop(histogram.name)
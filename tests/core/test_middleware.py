@@ -0,0 +1,119 @@
+import pytest
+from loguru import logger
+from sqlalchemy import select
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from httpx import AsyncClient, ASGITransport
+
+from setting import setting
+from core import middleware, request_log
+from core.db import async_session
+from core.middleware import BodyPrefix, QueryProfileMiddleware, RequestLogMiddleware
+from core.request_log import RequestLogPipeline, RequestLogRecord, request_log_records, should_log
+from modules.system.table import SysPost
+
+
+def test_body_prefix():
+    prefix = BodyPrefix(limit=5)
+    assert prefix.text() is None
+    prefix.feed(b'abc')
+    prefix.feed(b'defg')
+    prefix.feed(b'h')
+    assert prefix.truncated
+    assert prefix.text() == 'abcde...(8 bytes)'
+
+
+@pytest.mark.asyncio
+async def test_request_log_middleware():
+    async def echo(request: Request):
+        return Response(await request.body() * 2)
+
+    app = RequestLogMiddleware(Starlette(routes=[Route('/echo', echo, methods=['POST'])]), body_limit=4,
+                               pipeline=RequestLogPipeline())
+    messages = []
+    handler_id = logger.add(messages.append, format='{message}')
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+            response = await client.post('/echo?a=1', content=b'123456')
+    finally:
+        logger.remove(handler_id)
+
+    # 旁路记录不影响请求体和响应体
+    assert response.content == b'123456123456'
+    assert any('Request: POST /echo Params: a=1 Body: 1234...(6 bytes)' in m for m in messages)
+    assert any('Response: 200 Body: 1234...(12 bytes)' in m for m in messages)
+
+
+@pytest.mark.asyncio
+async def test_request_log_handler_error(monkeypatch):
+    def failing_handler(scope, record):
+        raise ValueError('handler error')
+
+    monkeypatch.setattr(request_log, 'request_log_handlers', [failing_handler])
+    monkeypatch.setattr(middleware, 'request_log_handlers', request_log.request_log_handlers)
+    app = RequestLogMiddleware(Starlette(routes=[Route('/ok', lambda _: Response(b'ok'))]),
+                               pipeline=RequestLogPipeline())
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+        response = await client.get('/ok')
+    # 处理函数出错不影响请求结果
+    assert response.status_code == 200 and response.content == b'ok'
+
+
+@pytest.mark.asyncio
+async def test_query_profile_middleware(session, monkeypatch):
+    monkeypatch.setattr(setting, 'database_profile', True)
+    monkeypatch.setattr(setting, 'debug', True)
+
+    async def posts(_):
+        # 循环里逐条查询
+        async with async_session() as s:
+            for post_id in range(6):
+                await s.execute(select(SysPost).where(SysPost.post_id == post_id))
+        return Response(b'ok')
+
+    app = QueryProfileMiddleware(Starlette(routes=[Route('/posts', posts)]), n_plus_one_threshold=5)
+    messages = []
+    handler_id = logger.add(messages.append, format='{level} {message}')
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+            response = await client.get('/posts')
+    finally:
+        logger.remove(handler_id)
+
+    assert response.content == b'ok'
+    assert int(response.headers['X-DB-Query-Count']) >= 6
+    assert float(response.headers['X-DB-Query-Time']) >= 0
+    assert [m for m in messages if m.startswith('WARNING') and 'GET /posts N+1 candidate: executed 6 times' in m]
+
+
+def test_should_log(monkeypatch):
+    monkeypatch.setattr(setting, 'request_log_sample_rate', 0)
+    monkeypatch.setattr(setting, 'request_log_sample_rates', {'/system': 1, '/system/dict/data/type': 0})
+    assert should_log('/system/user/list', 200, 0.01, False)
+    assert not should_log('/system/dict/data/type/sys_yes_no', 200, 0.01, False)
+    assert not should_log('/monitor/pool', 200, 0.01, False)
+    # 出错和慢请求总是记录
+    assert should_log('/monitor/pool', 500, 0.01, False)
+    assert should_log('/monitor/pool', None, 0.01, True)
+    assert should_log('/monitor/pool', 200, setting.request_log_slow_threshold, False)
+
+
+@pytest.mark.asyncio
+async def test_request_log_pipeline():
+    pipeline = RequestLogPipeline(maxsize=2)
+    messages = []
+    handler_id = logger.add(messages.append, format='{message}')
+    dropped = request_log_records.get(result='dropped')
+    try:
+        pipeline.start()
+        for i in range(3):
+            pipeline.submit(RequestLogRecord('GET', f'/path{i}', None, 200, 0.01, None, None))
+        # 队列满时丢弃, 请求中不写日志
+        assert request_log_records.get(result='dropped') == dropped + 1
+        assert messages == []
+        await pipeline.stop()
+    finally:
+        logger.remove(handler_id)
+    assert [m for m in messages if '/path0' in m] and [m for m in messages if '/path1' in m]
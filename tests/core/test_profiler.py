@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from loguru import logger
+from sqlalchemy import select
+
+from setting import setting
+from core import profiler
+from core.profiler import QueryProfile, current_profile
+from modules.system.table import SysPost
+
+
+@pytest.mark.asyncio
+async def test_query_profile(session):
+    profile = QueryProfile('test')
+    token = current_profile.set(profile)
+    try:
+        for post_id in range(1, 5):
+            await session.get(SysPost, post_id)
+        await session.scalars(select(SysPost))
+    finally:
+        current_profile.reset(token)
+
+    assert profile.count == 5
+    assert profile.total_time > 0
+    assert len(profile.slowest) == 3
+    n_plus_one = profile.n_plus_one(threshold=4)
+    assert len(n_plus_one) == 1
+    assert n_plus_one[0][1] == 4
+
+
+@pytest.mark.asyncio
+async def test_slow_query_log(session, monkeypatch):
+    monkeypatch.setattr(setting, 'slow_query_threshold', 1e-9)
+    monkeypatch.setattr(setting, 'slow_query_explain', True)
+    messages = []
+    handler_id = logger.add(messages.append, filter=lambda record: record['extra'].get('slow_query', False))
+    try:
+        await session.scalars(select(SysPost).where(SysPost.post_code == 'ceo'))
+        await asyncio.sleep(0.1)
+    finally:
+        logger.remove(handler_id)
+
+    assert any('slow query' in m and "params: ['str'" in m for m in messages)
+    assert any('slow query plan' in m for m in messages)
+
+
+@pytest.mark.asyncio
+async def test_slow_query_explain_skipped_when_busy(session, monkeypatch):
+    monkeypatch.setattr(setting, 'slow_query_threshold', 1e-9)
+    monkeypatch.setattr(setting, 'slow_query_explain', True)
+    # 已经有EXPLAIN在执行时不再占用连接池的连接
+    monkeypatch.setattr(profiler, '_explain_running', profiler._EXPLAIN_CONCURRENCY)
+    messages = []
+    handler_id = logger.add(messages.append, filter=lambda record: record['extra'].get('slow_query', False))
+    try:
+        await session.scalars(select(SysPost).where(SysPost.post_code == 'busy'))
+        await asyncio.sleep(0.1)
+    finally:
+        logger.remove(handler_id)
+
+    assert any('slow query' in m for m in messages)
+    assert not any('slow query plan' in m for m in messages)
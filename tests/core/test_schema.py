@@ -0,0 +1,20 @@
+import json
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+from core.schema import BaseResponse, TableDataInfo, TreeSelect, ModelResponse, dump_json
+from modules.system.user_service import SysUserDTO
+
+
+def test_dump_json_same_as_jsonable_encoder():
+    rows = [SysUserDTO(user_id=i, user_name=f'用户{i}', create_time=datetime(2024, 1, 2, 3, 4, 5, 6)) for i in range(3)]
+    tree = TreeSelect.build_tree(data_list=[TreeSelect(id=1, parent_id=0, label='a'),
+                                            TreeSelect(id=2, parent_id=1, label='b')])
+    for content in (TableDataInfo(rows=rows, total=3, next_cursor='abc'),
+                    BaseResponse(data=tree),
+                    dict(code=200, data=rows)):
+        assert json.loads(dump_json(content)) == jsonable_encoder(content)
+
+    response = ModelResponse(BaseResponse(data=rows[0]))
+    assert json.loads(response.body)['data']['userName'] == '用户0'
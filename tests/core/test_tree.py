@@ -0,0 +1,36 @@
+from core.schema import TreeSelect
+from core.tree import build_tree
+
+
+class Node:
+    def __init__(self, id, parent_id, order=0):
+        self.id = id
+        self.parent_id = parent_id
+        self.order = order
+        self.children = None
+
+
+def test_build_tree():
+    nodes = [Node(1, 0), Node(2, 1), Node(3, 1), Node(4, 2), Node(5, 99), Node(6, 7), Node(7, 6)]
+    roots = build_tree(nodes)
+    assert [n.id for n in roots] == [1]
+    assert [n.id for n in roots[0].children] == [2, 3]
+    assert [n.id for n in roots[0].children[0].children] == [4]
+    assert roots[0].children[1].children == []
+
+
+def test_build_tree_options():
+    nodes = [Node(1, 0, order=2), Node(2, 0, order=1), Node(3, 1), Node(4, 3), Node(5, 99, order=3)]
+    roots = build_tree(nodes, sort_key=lambda n: n.order, orphan_as_root=True, max_depth=2)
+    assert [n.id for n in roots] == [2, 1, 5]
+    assert [n.id for n in roots[1].children] == [3]
+    assert roots[1].children[0].children == []
+
+
+def test_tree_select_build_tree():
+    nodes = [Node(1, 0), Node(2, 1)]
+    for node in nodes:
+        node.label = f'node{node.id}'
+    tree = TreeSelect.build_tree(nodes)
+    assert tree[0].label == 'node1'
+    assert tree[0].children[0].id == 2
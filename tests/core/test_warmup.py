@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from core import warmup
+from core.cache import cache
+from modules.system import sys_dict_service, config_service, permission_service  # noqa: F401 注册预热函数
+
+
+@pytest.mark.asyncio
+async def test_run_warmup(session):
+    await cache.purge_namespace(sys_dict_service.REDIS_NAMESPACE)
+    report = await warmup.run_warmup(budget=10, concurrency=2)
+    assert report['status'] == 'done'
+    for name in ('sys_dict', 'sys_config', 'permission'):
+        result = report['warmers'][name]
+        assert result['status'] == 'done' and result['warmed'] == result['keys'] > 0
+    # 预热后读取直接命中
+    keys = await cache.namespace_keys(sys_dict_service.REDIS_NAMESPACE)
+    assert len(keys) == report['warmers']['sys_dict']['keys']
+    assert await sys_dict_service.find_dict_data_by_type('sys_yes_no')
+    assert len(await cache.namespace_keys(sys_dict_service.REDIS_NAMESPACE)) == len(keys)
+    assert await config_service.get_config_key('sys.index.skinName') is not None
+
+
+@pytest.mark.asyncio
+async def test_run_warmup_budget(monkeypatch):
+    async def slow_warmer(_):
+        await asyncio.sleep(10)
+        return []
+
+    monkeypatch.setitem(warmup.warmers, 'slow', slow_warmer)
+    report = await warmup.run_warmup(budget=0.05)
+    assert report['warmers']['slow']['status'] == 'timeout'
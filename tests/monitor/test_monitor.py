@@ -0,0 +1,57 @@
+import pytest
+
+from setting import setting
+from core.schema import ResponseCode
+from tests.test_util import extract_response
+
+baseurl = 'http://127.0.0.1/monitor'
+
+
+@pytest.mark.asyncio
+async def test_get_pool_status(client, auth_header):
+    response = await client.get(f'{baseurl}/pool', headers=auth_header)
+    pool_list = extract_response(response)
+    assert pool_list[0]['name'] == 'primary'
+    assert pool_list[0]['checkouts'] > 0
+
+
+@pytest.mark.asyncio
+async def test_get_session_stats(client, auth_header):
+    response = await client.get(f'{baseurl}/session', headers=auth_header)
+    data = extract_response(response)
+    assert data['total'] >= data['unused']
+
+
+@pytest.mark.asyncio
+async def test_get_cache_stats(client, auth_header):
+    response = await client.get(f'{baseurl}/cache', headers=auth_header)
+    cache_stats = extract_response(response)
+    assert 'user_permission' in [cache['namespace'] for cache in cache_stats['local']]
+    assert 'in_flight' in cache_stats['single_flight']
+
+
+@pytest.mark.asyncio
+async def test_get_warmup_report(client, auth_header):
+    response = await client.get(f'{baseurl}/warmup', headers=auth_header)
+    assert extract_response(response)['status'] in ('done', 'disabled')
+
+
+@pytest.mark.asyncio
+async def test_get_metrics(client, auth_header):
+    await client.get('http://127.0.0.1/system/dict/data/type/sys_yes_no', headers=auth_header)
+    response = await client.get(f'{baseurl}/metrics', headers=auth_header)
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'cache_requests_total{namespace="sys_dict",result="hits"}' in response.text
+    assert 'local_cache_entries{namespace="user_permission"}' in response.text
+
+
+@pytest.mark.asyncio
+async def test_monitor_requires_permission(client, monkeypatch):
+    for path in ('pool', 'session', 'cache', 'warmup', 'metrics'):
+        response = await client.get(f'{baseurl}/{path}')
+        assert response.json()['code'] == ResponseCode.LOGIN_REQUIRE
+    # Prometheus使用配置的token抓取, 不需要登录
+    monkeypatch.setattr(setting, 'metrics_token', 'scrape-token')
+    response = await client.get(f'{baseurl}/metrics', headers=dict(authorization='bearer scrape-token'))
+    assert response.status_code == 200 and 'cache_requests_total' in response.text
@@ -1,6 +1,10 @@
+import asyncio
+
 import pytest
 
+from core.cache import cache
 from core.schema import ResponseCode
+from modules.system import config_service
 
 baseurl = 'http://127.0.0.1/system/config'
 
@@ -79,3 +83,35 @@ async def test_delete(client, auth_header):
 
     after_roles = await get_data_list(client, auth_header)
     assert before_count - 1 == len(after_roles)
+
+
+@pytest.mark.asyncio
+async def test_negative_cache(session):
+    config_key = 'test.negative.key'
+    assert await config_service.get_config_key(config_key) is None
+    # 不存在的key也有缓存条目, 再次读取不查库
+    assert len(await cache.namespace_keys(config_service.CACHE_NAMESPACE)) > 0
+    stats = {item['namespace']: item for item in cache.fill_stats()}
+    negative_hits = stats[config_service.CACHE_NAMESPACE]['negative_hits']
+    assert await config_service.get_config_key(config_key) is None
+    stats = {item['namespace']: item for item in cache.fill_stats()}
+    assert stats[config_service.CACHE_NAMESPACE]['negative_hits'] == negative_hits + 1
+
+    # 新增提交后负缓存随namespace失效, 提交前仍返回缓存
+    await config_service.create(config_service.SysConfigDTO(config_name='negative', config_key=config_key,
+                                                            config_value='value'), 1, session)
+    assert await config_service.get_config_key(config_key) is None
+    await session.commit()
+    assert await config_service.get_config_key(config_key) == 'value'
+
+
+@pytest.mark.asyncio
+async def test_shared_load_survives_cancelled_caller():
+    await cache.purge_namespace(config_service.CACHE_NAMESPACE)
+    first = asyncio.create_task(config_service.get_config_key('sys.index.skinName'))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(config_service.get_config_key('sys.index.skinName'))
+    await asyncio.sleep(0)
+    # 发起加载的请求取消后, 等待的请求仍拿到结果
+    first.cancel()
+    assert await second is not None
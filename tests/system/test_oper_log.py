@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import select
+
+from core import db
+from setting import setting
+from modules.system.oper_log_service import oper_log_writer, mask_passwords
+from modules.system.table import SysOperLog
+from tests.test_util import extract_response
+
+baseurl = 'http://127.0.0.1/system/post'
+
+
+@pytest.mark.asyncio
+async def test_oper_log(client, auth_header, session, monkeypatch):
+    monkeypatch.setattr(setting, 'oper_log_enabled', True)
+    response = await client.post(baseurl, headers=auth_header,
+                                 json=dict(postCode='oper_log', postName='操作日志', postSort=1, status='0'))
+    extract_response(response, return_data=False)
+    # 参数校验失败, 接口返回错误
+    await client.post(baseurl, headers=auth_header, json=dict(postCode='oper_log', postSort='x'))
+    # 登录不记录
+    await client.post('http://127.0.0.1/login', json=dict(username='admin', password='wrong'))
+    # 等待后台写入, 后台写入不使读取走主库
+    monkeypatch.setattr(db, '_primary_until', 0.0)
+    await oper_log_writer.stop()
+    assert db._primary_until == 0.0
+    oper_log_writer.start()
+
+    logs = (await session.scalars(select(SysOperLog).order_by(SysOperLog.oper_id))).all()
+    assert [(log.request_method, log.oper_url, log.status) for log in logs] == [
+        ('POST', '/system/post', '0'), ('POST', '/system/post', '1')]
+    assert logs[0].business_type == '1'
+    assert logs[0].oper_name == 'admin'
+    assert logs[0].method.endswith('create_post_endpoint')
+    assert logs[1].error_msg
+
+
+def test_mask_passwords():
+    assert mask_passwords('{"userName":"a","password":"secret","x":1}') == '{"userName":"a","password":"******","x":1}'
+    assert mask_passwords('{"oldPassword":"se\\"cret","newPassword":1}') == (
+        '{"oldPassword":"******","newPassword":"******"}')
+    # 请求体在密码中间截断
+    assert mask_passwords('{"password":"secr...(4096 bytes)') == '{"password":"******"'
+    assert mask_passwords('userName=a&password=secret&x=1') == 'userName=a&password=******&x=1'
@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import delete
+
+from core.cache import cache
+from modules.system import permission_service
+from modules.system.table import SysRole, SysRoleMenu, SysUserRole
+
+
+@pytest.mark.asyncio
+async def test_user_permissions(session):
+    permission_service.bump_permission_version()
+    permissions = await permission_service.get_user_permissions(2)
+    assert {'system:user:list', 'system:role:list'} <= permissions
+
+    # 角色相同的用户共用一份缓存
+    session.add(SysUserRole(user_id=99, role_id=2))
+    await session.commit()
+    permissions = await permission_service.get_user_permissions(2)
+    size = len(permission_service.permission_cache)
+    assert await permission_service.get_user_permissions(99) == permissions
+    # 只新增了用户99的角色ID缓存
+    assert len(permission_service.permission_cache) == size + 1
+    assert await permission_service.get_user_permissions(100) == frozenset()
+
+
+@pytest.mark.asyncio
+async def test_permission_cache_requests():
+    def stats():
+        item = {item['namespace']: item for item in cache.fill_stats()}.get(permission_service.PERMISSION_NAMESPACE)
+        return (item['hits'], item['misses']) if item else (0, 0)
+
+    permission_service.bump_permission_version()
+    hits, misses = stats()
+    await permission_service.get_user_permissions(2)
+    # 位序号、角色ID集合和位图各加载一次
+    assert stats() == (hits, misses + 3)
+    await permission_service.get_user_permissions(2)
+    assert stats() == (hits + 3, misses + 3)
+
+
+@pytest.mark.asyncio
+async def test_permission_version_bump_on_write(session):
+    permission_service.bump_permission_version()
+    assert 'system:user:list' in await permission_service.get_user_permissions(2)
+
+    version = await permission_service.get_permission_version()
+    await session.execute(delete(SysRoleMenu).where(SysRoleMenu.role_id == 2, SysRoleMenu.menu_id == 100))
+    await session.commit()
+    assert await permission_service.get_permission_version() == version + 1
+    assert 'system:user:list' not in await permission_service.get_user_permissions(2)
+
+    role = await session.get(SysRole, 2)
+    role.status = '1'
+    await session.commit()
+    assert await permission_service.get_permission_version() == version + 2
+    assert await permission_service.get_user_permissions(2) == frozenset()
+
+
+@pytest.mark.asyncio
+async def test_permission_version_not_bump_on_rollback(session):
+    version = await permission_service.get_permission_version()
+    await session.execute(delete(SysUserRole).where(SysUserRole.user_id == 2))
+    await session.rollback()
+    assert await permission_service.get_permission_version() == version
+
+
+def test_permission_registry():
+    registry = permission_service.PermissionRegistry(['a', 'b', 'c'])
+    bitmap = registry.to_bitmap(['a', 'c', 'x'])
+    assert bitmap == 0b101
+    assert registry.to_set(bitmap) == {'a', 'c'}
+    assert registry.check(bitmap, ('a', 'c'))
+    assert not registry.check(bitmap, ('a', 'b'))
+    assert registry.check(bitmap, ('a', 'b'), require_all=False)
+    # 未登记的权限
+    assert not registry.check(bitmap, ('a', 'x'))
+    assert registry.check(bitmap, ('a', 'x'), require_all=False)
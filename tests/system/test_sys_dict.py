@@ -1,6 +1,6 @@
 import pytest
 
-from core.redis import redis, clear_cache_by_namespace
+from core.cache import cache
 from modules.system import sys_dict_service
 from tests.test_util import extract_response
 
@@ -159,24 +159,22 @@ async def test_sys_dict_type_option_select(client, auth_header):
 
 @pytest.mark.asyncio
 async def test_cache_for_find_dict_data_by_type(session):
-    await clear_cache_by_namespace('sys_dict')
+    await cache.purge_namespace('sys_dict')
 
-    dict_data_list = await sys_dict_service.find_dict_data_by_type(
-        dict_type='sys_yes_no',
-        session=session
-    )
+    dict_data_list = await sys_dict_service.find_dict_data_by_type(dict_type='sys_yes_no')
     assert len(dict_data_list) == 2
 
-    keys = await redis.keys(f'sys_dict:*')
+    keys = await cache.namespace_keys('sys_dict')
     assert len(keys) == 1
 
 
 @pytest.mark.asyncio
 async def test_cache_evict_for_create_dict_data(session):
-    await clear_cache_by_namespace('sys_dict')
+    await cache.purge_namespace('sys_dict')
 
-    dict_data_list = await sys_dict_service.find_dict_data_by_type(dict_type='sys_yes_no', session=session)
+    dict_data_list = await sys_dict_service.find_dict_data_by_type(dict_type='sys_yes_no')
     assert len(dict_data_list) == 2
+    generation = await cache.generation('sys_dict')
 
     await sys_dict_service.create_dict_data(
         form=sys_dict_service.SysDictDataDTO(
@@ -187,6 +185,39 @@ async def test_cache_evict_for_create_dict_data(session):
         operator_id=1,
         session=session
     )
+    # 提交后才失效
+    assert await cache.generation('sys_dict') == generation
+    await session.commit()
+
+    # 只递增代数, 旧代数的key等待过期
+    assert await cache.generation('sys_dict') == generation + 1
+    dict_data_list = await sys_dict_service.find_dict_data_by_type(dict_type='sys_yes_no')
+    assert len(dict_data_list) == 3
+
 
-    keys = await redis.keys(f'sys_dict:*')
-    assert len(keys) == 0
+@pytest.mark.asyncio
+async def test_refresh_cache_purge_keys(client, auth_header, session):
+    await sys_dict_service.find_dict_data_by_type(dict_type='sys_yes_no')
+    assert len(await cache.namespace_keys('sys_dict')) > 0
+
+    response = await client.delete(f'{dict_url}/refreshCache', headers=auth_header)
+    extract_response(response)
+    assert len(await cache.namespace_keys('sys_dict')) == 0
+
+
+@pytest.mark.asyncio
+async def test_dict_data_by_type_raw_response(client, auth_header):
+    await cache.purge_namespace('sys_dict')
+    for _ in range(2):
+        # 第一次查库回填, 第二次直接写入缓存的JSON
+        response = await client.get(f'{item_url}/type/sys_yes_no', headers=auth_header)
+        data = extract_response(response)
+        assert [item['dictValue'] for item in data] == ['Y', 'N']
+
+
+@pytest.mark.asyncio
+async def test_negative_cache_for_empty_dict_type(session):
+    await cache.purge_namespace('sys_dict')
+    assert await sys_dict_service.find_dict_data_by_type('pytest_empty_dict_type') == []
+    assert len(await cache.namespace_keys('sys_dict')) == 1
+    assert await sys_dict_service.find_dict_data_json_by_type('pytest_empty_dict_type') == b'[]'
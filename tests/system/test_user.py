@@ -171,3 +171,22 @@ async def test_update_auth_role(client, auth_header):
     response = await client.get(f'{baseurl}/authRole/{user_id}', headers=auth_header)
     response_data = extract_response(response, return_data=False)
     assert len(response_data['roles']) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_users_by_cursor(client, auth_header):
+    response = await client.get(f"{baseurl}/list", headers=auth_header, params={'pageSize': 1})
+    first_page = extract_response(response, return_data=False)
+    assert len(first_page['rows']) == 1
+    assert first_page['nextCursor'] is not None
+
+    response = await client.get(f"{baseurl}/list", headers=auth_header, params={
+        'pageSize': 1,
+        'after': first_page['nextCursor']
+    })
+    second_page = extract_response(response, return_data=False)
+    assert second_page['total'] == first_page['total']
+    assert second_page['rows'][0]['userId'] > first_page['rows'][0]['userId']
+
+    response = await client.get(f"{baseurl}/list", headers=auth_header, params={'after': 'invalid'})
+    assert response.json()['code'] == ResponseCode.BAD_REQUEST